@@ -0,0 +1,160 @@
+"""Benchmarks of the ZacrosIOTools input writers, output readers and analysis functions.
+
+Usage:
+    python benchmarks/run_benchmarks.py --size small --output results.json
+
+Each benchmark reports its wall time, throughput and peak Python memory (tracemalloc, which includes NumPy
+arrays). The memory is measured in a second run, because tracing slows Python code down, and only covers the main
+process (not the workers of create_job_dirs). The JSON results can be compared between releases.
+"""
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import matplotlib  # noqa: E402
+matplotlib.use('Agg')
+
+from synthetic_outputs import make_job, make_input_dataframes, write_lattice_input  # noqa: E402
+from zacrosio.kmc_job import NewKMCJob  # noqa: E402
+from zacrosio.read_functions import parse_general_output, read_specnum, clear_specnum_cache, get_history_index, \
+    read_history_snapshot  # noqa: E402
+from zacrosio.analysis_functions import get_tof, get_selectivity, analyze, get_process_statistics  # noqa: E402
+from zacrosio.plot_functions import decimate, get_tof_curve  # noqa: E402
+
+sizes = {'small': {'n_temperatures': 20, 'n_steps': 20, 'n_specnum_rows': 20000, 'n_event_lines': 20000,
+                   'n_procstat_snapshots': 200, 'n_history_snapshots': 20, 'n_x': 10, 'n_y': 10},
+         'medium': {'n_temperatures': 200, 'n_steps': 60, 'n_specnum_rows': 500000, 'n_event_lines': 1000000,
+                    'n_procstat_snapshots': 2000, 'n_history_snapshots': 100, 'n_x': 50, 'n_y': 50},
+         'large': {'n_temperatures': 2000, 'n_steps': 60, 'n_specnum_rows': 5000000, 'n_event_lines': 10000000,
+                   'n_procstat_snapshots': 20000, 'n_history_snapshots': 200, 'n_x': 100, 'n_y': 100}}
+
+
+def measure(name, function, n_items, unit, setup=None):
+    """Returns the wall time, throughput (n_items / s) and peak memory of function. It is run once without
+    tracemalloc for the timing and once more with it for the memory. setup is called before each run, e.g. to remove
+    the files created by the previous one."""
+    if setup is not None:
+        setup()
+    start = time.perf_counter()
+    function()
+    seconds = time.perf_counter() - start
+    if setup is not None:
+        setup()
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    result = {'name': name, 'seconds': seconds, 'throughput': n_items / seconds if seconds > 0 else float('inf'),
+              'unit': f"{unit}/s", 'peak_memory_mb': peak / 2 ** 20}
+    print(f"{name:<32s} {seconds:10.4f} s {result['throughput']:14.1f} {unit}/s {result['peak_memory_mb']:10.1f} MB")
+    return result
+
+
+def run_benchmarks(size, work_dir):
+    parameters = sizes[size]
+    results = []
+
+    # Input generation
+    df_gas, df_mechanism, df_energetics = make_input_dataframes(n_steps=parameters['n_steps'])
+    write_lattice_input(work_dir)
+    job = NewKMCJob(df_gas=df_gas, df_mechanism=df_mechanism, df_energetics=df_energetics,
+                    lattice_path=f"{work_dir}/lattice_input.dat")
+    simulation_tags = {'snapshots': 'on time 0.1', 'process_statistics': 'on time 0.1',
+                       'species_numbers': 'on time 0.01', 'event_report': 'off', 'max_steps': 'infinity',
+                       'max_time': 10.0, 'wall_time': 86400}
+    dict_pressure = {molecule: 1.0 for molecule in df_gas.index}
+    temperatures = np.linspace(400, 800, parameters['n_temperatures'])
+
+    def create_job_dirs_serial():
+        for T in temperatures:
+            job.create_job_dir(path=f"{work_dir}/serial_{T:.2f}K", T=T, simulation_tags=simulation_tags,
+                               dict_pressure=dict_pressure, random_seed=123456)
+
+    def create_job_dirs_parallel():
+        job.create_job_dirs([{'path': f"{work_dir}/parallel_{T:.2f}K", 'T': T, 'simulation_tags': simulation_tags,
+                              'dict_pressure': dict_pressure} for T in temperatures])
+
+    def remove_job_dirs():
+        for job_path in glob.glob(f"{work_dir}/serial_*K") + glob.glob(f"{work_dir}/parallel_*K"):
+            shutil.rmtree(job_path)
+
+    results.append(measure('create_job_dir', create_job_dirs_serial, len(temperatures), 'jobs', setup=remove_job_dirs))
+    results.append(measure('create_job_dirs', create_job_dirs_parallel, len(temperatures), 'jobs',
+                           setup=remove_job_dirs))
+
+    # Output files
+    path = make_job(f"{work_dir}/outputs", n_specnum_rows=parameters['n_specnum_rows'],
+                    n_event_lines=parameters['n_event_lines'], n_procstat_snapshots=parameters['n_procstat_snapshots'],
+                    n_history_snapshots=parameters['n_history_snapshots'], n_x=parameters['n_x'],
+                    n_y=parameters['n_y'], n_steps=parameters['n_steps'])
+    area = parse_general_output(path, fields=['area'])['area']
+    n_rows = parameters['n_specnum_rows']
+    general_output_mb = os.path.getsize(f"{path}/general_output.txt") / 2 ** 20
+
+    results.append(measure('parse_general_output', lambda: parse_general_output(path), general_output_mb, 'MB'))
+    results.append(measure('read_specnum', lambda: read_specnum(path), n_rows, 'rows'))
+    results.append(measure('read_specnum_cache_build', lambda: read_specnum(path, cache=True), n_rows, 'rows',
+                           setup=lambda: clear_specnum_cache(path)))
+    results.append(measure('read_specnum_cache_load', lambda: np.asarray(read_specnum(path, cache=True)[1]).sum(),
+                           n_rows, 'rows'))
+    # the analysis functions all parse the text file, so that they can be compared with each other
+    results.append(measure('get_tof', lambda: get_tof(path, 'G1', area, cache=False), n_rows, 'rows'))
+    results.append(measure('get_selectivity', lambda: get_selectivity(path, 'G1', ['G2'], area=area, cache=False),
+                           n_rows, 'rows'))
+    results.append(measure('analyze', lambda: analyze(path, area, products=['G1', 'G2'], selectivity={'G1': ['G2']},
+                                                      surf_species=['S0*', 'S1*'], cache=False), n_rows, 'rows'))
+    results.append(measure('get_process_statistics', lambda: get_process_statistics(path),
+                           parameters['n_procstat_snapshots'], 'snapshots'))
+    def remove_history_index():
+        if os.path.isfile(f"{path}/.history_output.index.npz"):
+            os.remove(f"{path}/.history_output.index.npz")
+
+    results.append(measure('get_history_index', lambda: get_history_index(path),
+                           parameters['n_history_snapshots'], 'snapshots', setup=remove_history_index))
+    index = get_history_index(path)
+    results.append(measure('read_history_snapshot', lambda: [read_history_snapshot(path, k, index=index)
+                                                             for k in range(0, len(index[1]), 10)],
+                           len(range(0, len(index[1]), 10)), 'snapshots'))
+
+    # Plotting data preparation
+    header, data = read_specnum(path, columns=['Time', 'G1'])
+    results.append(measure('get_tof_curve', lambda: get_tof_curve(data[:, 0], data[:, 1], area), n_rows, 'rows'))
+    results.append(measure('decimate', lambda: decimate(data[:, 0], data[:, 1], 2000), n_rows, 'rows'))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size', choices=list(sizes), default='small')
+    parser.add_argument('--output', default=None, help='JSON file where the results are saved')
+    parser.add_argument('--work-dir', default=None, help='Directory for the synthetic files (default: temporary)')
+    args = parser.parse_args()
+
+    work_dir = args.work_dir if args.work_dir is not None else tempfile.mkdtemp(prefix='zacrosio_bench_')
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir)
+    try:
+        results = run_benchmarks(args.size, work_dir)
+    finally:
+        if args.work_dir is None:
+            shutil.rmtree(work_dir)
+    report = {'size': args.size, 'parameters': sizes[args.size], 'python': platform.python_version(),
+              'numpy': np.__version__, 'platform': platform.platform(), 'results': results}
+    if args.output is not None:
+        with open(args.output, 'w') as outfile:
+            json.dump(report, outfile, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,212 @@
+"""Synthetic ZACROS inputs and outputs of configurable size, used by the benchmarks.
+
+The files follow the layout of the real ZACROS files closely enough for the ZacrosIOTools readers, but the numbers
+are random and have no physical meaning.
+"""
+import os
+import numpy as np
+import pandas as pd
+
+lattice_input = """lattice periodic_cell
+
+   cell_vectors
+      2.77185858   0.00000000
+      1.38592929   2.40050000
+   repeat_cell {n_x} {n_y}
+   n_site_types 1
+   site_type_names top
+   n_cell_sites 1
+   site_types top
+   site_coordinates
+      0.00000000   0.00000000
+   neighboring_structure
+      1-1  north
+      1-1  east
+      1-1  southeast
+   end_neighboring_structure
+
+end_lattice
+"""
+
+
+def get_species(n_gas_species, n_surf_species):
+    gas_species = [f"G{i}" for i in range(n_gas_species)]
+    surf_species = [f"S{i}*" for i in range(n_surf_species)]
+    return gas_species, surf_species
+
+
+def get_step_names(n_steps):
+    return [f"step_{i}" for i in range(n_steps)]
+
+
+def make_input_dataframes(n_gas_species=3, n_surf_species=6, n_steps=60, seed=0):
+    """Returns df_gas, df_mechanism and df_energetics for a synthetic reaction model."""
+    rng = np.random.default_rng(seed)
+    gas_species, surf_species = get_species(n_gas_species, n_surf_species)
+    df_gas = pd.DataFrame({'type': 'non_linear',
+                           'gas_molec_weight': rng.uniform(2, 60, n_gas_species).round(2),
+                           'sym_number': 1,
+                           'degeneracy': 1,
+                           'inertia_list': [str(rng.uniform(1, 50, 3).round(2).tolist()) for _ in gas_species],
+                           'gas_energy': rng.uniform(-3, 0, n_gas_species).round(2)}, index=gas_species)
+    rows = []
+    for i in range(n_steps):
+        adsorption = i < n_gas_species
+        rows.append({'sites': 1 if adsorption else 2,
+                     'site_types': 'top' if adsorption else 'top top',
+                     'neighboring': None if adsorption else '1-2',
+                     'initial': "['1 * 1']" if adsorption else "['1 S0* 1','2 * 1']",
+                     'final': "['1 S0* 1']" if adsorption else "['1 * 1','2 S0* 1']",
+                     'activ_eng': round(float(rng.uniform(0, 1.5)), 2),
+                     'prox_factor': None,
+                     'angles': None,
+                     'vib_list_is': '[]' if adsorption else str(rng.uniform(20, 400, 6).round(1).tolist()),
+                     'vib_list_ts': '[]' if adsorption else str(rng.uniform(20, 400, 5).round(1).tolist()),
+                     'vib_list_fs': str(rng.uniform(20, 400, 6).round(1).tolist()),
+                     'molecule': gas_species[i] if adsorption else None,
+                     'A_site': 6.65 if adsorption else None})
+    df_mechanism = pd.DataFrame(rows, index=get_step_names(n_steps))
+    df_energetics = pd.DataFrame({'sites': 1, 'neighboring': None,
+                                  'lattice_state': [f"['1 {species} 1']" for species in surf_species],
+                                  'site_types': 'top', 'graph_multiplicity': None, 'angles': None,
+                                  'cluster_eng': rng.uniform(-2, 0, n_surf_species).round(2)},
+                                 index=[f"{species[:-1]}_point" for species in surf_species])
+    return df_gas, df_mechanism, df_energetics
+
+
+def write_lattice_input(path, n_x=10, n_y=10):
+    with open(f"{path}/lattice_input.dat", 'w') as outfile:
+        outfile.write(lattice_input.format(n_x=n_x, n_y=n_y))
+
+
+def write_specnum_output(path, n_rows, n_gas_species=3, n_surf_species=6, seed=0):
+    """Writes a specnum_output.txt with n_rows rows and linearly growing productions."""
+    rng = np.random.default_rng(seed)
+    gas_species, surf_species = get_species(n_gas_species, n_surf_species)
+    time = np.linspace(0, 10.0, n_rows)
+    rates = rng.uniform(10, 1000, n_gas_species) * np.where(np.arange(n_gas_species) == 0, -1, 1)
+    production = np.rint(time[:, np.newaxis] * rates + rng.normal(0, 2, (n_rows, n_gas_species))).astype(np.int64)
+    coverage = rng.integers(0, 100, (n_rows, n_surf_species))
+    data = np.column_stack([np.arange(1, n_rows + 1), np.arange(n_rows) * 37, time, np.full(n_rows, 500.0),
+                            rng.normal(-100, 1, n_rows), coverage, production])
+    header = ''.join(f"{name:>15s}" for name in ['Entry', 'Nevents', 'Time', 'Temperature', 'Energy']
+                     + surf_species + gas_species)
+    fmt = ['%15d', '%15d', '%15.8e', '%15.8e', '%15.8e'] + ['%15d'] * (n_surf_species + n_gas_species)
+    np.savetxt(f"{path}/specnum_output.txt", data, fmt=fmt, header=header, comments='', delimiter=' ')
+
+
+def write_general_output(path, n_event_lines=0, n_gas_species=3, n_surf_species=6, n_steps=60, n_x=10, n_y=10):
+    """Writes a general_output.txt with the usual header, n_event_lines lines of event reports and a normal
+    termination."""
+    gas_species, surf_species = get_species(n_gas_species, n_surf_species)
+    n_sites = n_x * n_y
+    network = ''.join(f"    {i + 1:4d}. {name}:    A(Tini) =  1.0000E+13;  Ea       =  0.50;  k(Tini) =  1.0000E+08;  "
+                      f"Reaction: S0*(top)  ->  S0*(top)\n"
+                      for i, name in enumerate(f"{step}_{direction}" for step in get_step_names(n_steps)
+                                               for direction in ['fwd', 'rev']))
+    with open(f"{path}/general_output.txt", 'w') as outfile:
+        outfile.write(f"""+---------------------------------------------------+
+|  ZACROS 3.01                                      |
++---------------------------------------------------+
+
+Simulation setup:
+~~~~~~~~~~~~~~~~~
+
+    Random sequence with seed: 123456
+
+    Temperature: 500.00000000000000
+
+    Pressure: 1.0000000000000000
+
+    Number of gas species: {n_gas_species}
+
+    Gas species names: {' '.join(gas_species)}
+
+    Number of surface species: {n_surf_species}
+
+    Surface species names: {' '.join(surf_species)}
+
+Finished reading simulation input.
+
+Lattice setup:
+~~~~~~~~~~~~~~
+
+    Lattice surface area: {6.6538 * n_sites:.8f}
+
+    Total number of lattice sites: {n_sites}
+
+    Number of site types: 1
+
+    Site type names and total number of sites of that type:
+      top ({n_sites})
+
+Finished reading lattice input.
+
+Mechanism setup:
+~~~~~~~~~~~~~~~~
+
+    Number of elementary steps: {2 * n_steps}
+
+    Reaction network:
+
+{network}
+Finished reading mechanism input.
+
+Commencing simulation:
+~~~~~~~~~~~~~~~~~~~~~~
+""")
+        line = "KMC step 1000000 / time 1.000000E-01 / event step_0_fwd at sites 1 2\n"
+        block = line * 10000
+        for _ in range(n_event_lines // 10000):
+            outfile.write(block)
+        outfile.write(line * (n_event_lines % 10000))
+        outfile.write("\nSimulation stopped:\n~~~~~~~~~~~~~~~~~~~\n Current KMC time: 10.0\n\n> Normal termination <\n")
+
+
+def write_procstat_output(path, n_snapshots, n_steps=60, seed=0):
+    """Writes a procstat_output.txt with n_snapshots snapshots of cumulative event counts."""
+    rng = np.random.default_rng(seed)
+    names = [f"{step}_{direction}" for step in get_step_names(n_steps) for direction in ['fwd', 'rev']]
+    rates = 10 ** rng.uniform(0, 8, len(names))
+    time = np.linspace(0, 10.0, n_snapshots)
+    with open(f"{path}/procstat_output.txt", 'w') as outfile:
+        outfile.write(f"{'Overall':<20s}" + ''.join(f"{name:>25s}" for name in names) + '\n')
+        for i, t in enumerate(time):
+            occurrences = np.floor(rates * t).astype(np.int64)
+            outfile.write(f"configuration {i + 1:8d} {t:.16E}\n")
+            outfile.write(' '.join(['0.0000000000000000E+00'] * (len(names) + 1)) + '\n')
+            outfile.write(f"{occurrences.sum():d} " + ' '.join(map(str, occurrences)) + '\n')
+
+
+def write_history_output(path, n_snapshots, n_x=10, n_y=10, n_gas_species=3, n_surf_species=6, seed=0):
+    """Writes a history_output.txt with n_snapshots snapshots of a n_x x n_y lattice."""
+    rng = np.random.default_rng(seed)
+    gas_species, surf_species = get_species(n_gas_species, n_surf_species)
+    n_sites = n_x * n_y
+    sites = np.arange(1, n_sites + 1)
+    with open(f"{path}/history_output.txt", 'w') as outfile:
+        outfile.write(f"Gas_Species:   {'   '.join(gas_species)}\n")
+        outfile.write(f"Surface_Species:   {'   '.join(surf_species)}\n")
+        outfile.write("Site_Types:   top\n")
+        for k in range(n_snapshots):
+            species = rng.integers(0, n_surf_species + 1, n_sites)
+            occupied = species > 0
+            lattice_state = np.column_stack([sites, np.where(occupied, sites, 0), species, occupied.astype(int)])
+            outfile.write(f"configuration {k + 1:8d} {k * 1000:20d}  {0.1 * k:.15E}   500.0   {-100.0:.15E}\n")
+            np.savetxt(outfile, lattice_state, fmt='%8d', delimiter='')
+            outfile.write(''.join(f"{x:8d}" for x in rng.integers(0, 1000, n_gas_species)) + '\n')
+
+
+def make_job(path, n_specnum_rows=100000, n_event_lines=100000, n_procstat_snapshots=1000, n_history_snapshots=100,
+             n_x=10, n_y=10, n_gas_species=3, n_surf_species=6, n_steps=60, seed=0):
+    """Creates a directory with a complete set of synthetic output files."""
+    if not os.path.exists(path):
+        os.makedirs(path)
+    write_lattice_input(path, n_x=n_x, n_y=n_y)
+    write_specnum_output(path, n_specnum_rows, n_gas_species=n_gas_species, n_surf_species=n_surf_species, seed=seed)
+    write_general_output(path, n_event_lines=n_event_lines, n_gas_species=n_gas_species,
+                         n_surf_species=n_surf_species, n_steps=n_steps, n_x=n_x, n_y=n_y)
+    write_procstat_output(path, n_procstat_snapshots, n_steps=n_steps, seed=seed)
+    write_history_output(path, n_history_snapshots, n_x=n_x, n_y=n_y, n_gas_species=n_gas_species,
+                         n_surf_species=n_surf_species, seed=seed)
+    return path
@@ -1,4 +1,9 @@
+import sys
 import numpy as np
+import pandas as pd
+from zacrosio.read_functions import read_specnum, read_procstat_window, read_history_header, get_history_index, \
+    iter_history
+from zacrosio.profiling_functions import profile
 
 
 def find_nearest(array, value):
@@ -7,13 +12,12 @@ def find_nearest(array, value):
     return array[idx]
 
 
-def get_tof(path, molecule, area, ignore=0.2):
-    with open(f"{path}/specnum_output.txt", "r") as infile:
-        header = infile.readline().split()
-    data = np.loadtxt(f"{path}/specnum_output.txt", skiprows=1)
+@profile()
+def get_tof(path, molecule, area, ignore=0.2, cache=False):
+    header, data = read_specnum(path, columns=['Time', molecule], cache=cache)
     production = data[:, header.index(molecule)]
-    time = data[:, 2]
-    final_time = data[-1, 2]
+    time = data[:, 0]
+    final_time = data[-1, 0]
     index = np.where(time == find_nearest(time, final_time * ignore))[0][0]
     production = np.delete(production, np.s_[0:index], axis=0)
     time = np.delete(time, np.s_[0:index], axis=0)
@@ -23,16 +27,15 @@ def get_tof(path, molecule, area, ignore=0.2):
     return tof
 
 
-def get_selectivity(path, main, secondary, minimum=0.0, ignore=0.2, return_tof=False, area=None):
-    with open(f"{path}/specnum_output.txt", "r") as infile:
-        header = infile.readline().split()
-    data = np.loadtxt(f"{path}/specnum_output.txt", skiprows=1)
+@profile()
+def get_selectivity(path, main, secondary, minimum=0.0, ignore=0.2, return_tof=False, area=None, cache=False):
+    header, data = read_specnum(path, columns=['Time', main] + list(secondary), cache=cache)
     production_main = data[:, header.index(main)]
     production_secondary = np.zeros(len(data))
     for molecule in secondary:
         production_secondary += data[:, header.index(molecule)]
-    time = data[:, 2]
-    final_time = data[-1, 2]
+    time = data[:, 0]
+    final_time = data[-1, 0]
     index = np.where(time == find_nearest(time, final_time * ignore))[0][0]
     production_main = np.delete(production_main, np.s_[0:index], axis=0)
     production_secondary = np.delete(production_secondary, np.s_[0:index], axis=0)
@@ -47,7 +50,7 @@ def get_selectivity(path, main, secondary, minimum=0.0, ignore=0.2, return_tof=F
         selectivity = mol_main / mol_total * 100
     if return_tof:
         if selectivity > minimum:
-            tof = get_tof(path=path, molecule=main, area=area, ignore=ignore)
+            tof = get_tof(path=path, molecule=main, area=area, ignore=ignore, cache=cache)
         else:
             tof = float('NaN')
         return tof
@@ -57,5 +60,203 @@ def get_selectivity(path, main, secondary, minimum=0.0, ignore=0.2, return_tof=F
     return selectivity
 
 
+def get_ignore_index(time, ignore):
+    """Returns the index of the time closest to final_time * ignore, using a binary search on the (sorted) time."""
+    target = time[-1] * ignore
+    index = int(np.searchsorted(time, target))
+    if index == len(time) or (index > 0 and target - time[index - 1] <= time[index] - target):
+        index -= 1
+    return index
 
 
+def analyze(path, area, products=None, selectivity=None, surf_species=None, n_sites=None, ignore=0.2, cache=False):
+    """Calculates several TOFs, selectivities and average coverages reading specnum_output.txt only once.
+
+    Arguments:
+        path (str): The path of the job
+        area (float): The lattice surface area in Å2
+        products (list): Molecules for which the TOF is calculated, e.g. ['CO2', 'H2O']
+        selectivity (dict): Main product and list of secondary products of each selectivity, e.g. {'CH4': ['CO2']}
+        surf_species (list): Surface species for which the average coverage is calculated, e.g. ['CO*', 'O*']
+        n_sites (int): Total number of lattice sites. If given, coverages are returned as fractions of the sites
+            instead of number of species
+        ignore (float): Fraction of the simulation time that is discarded
+
+    Returns a dictionary {'tof': {...}, 'selectivity': {...}, 'coverage': {...}}.
+    """
+    products = list(products) if products is not None else []
+    selectivity = dict(selectivity) if selectivity is not None else {}
+    surf_species = list(surf_species) if surf_species is not None else []
+    gas_species = list(dict.fromkeys(products + [molecule for main, secondary in selectivity.items()
+                                                 for molecule in [main] + list(secondary)]))
+    header, data = read_specnum(path, columns=['Time'] + gas_species + surf_species, cache=cache)
+    index = get_ignore_index(data[:, 0], ignore)
+    time = data[index:, 0]
+    results = {'tof': {}, 'selectivity': {}, 'coverage': {}}
+
+    if gas_species:
+        # All linear fits in one least-squares solve: production = slope * time + intercept
+        columns = [header.index(molecule) for molecule in gas_species]
+        production = data[index:, columns]
+        a = np.vstack([time, np.ones(len(time))]).T
+        slopes = np.linalg.lstsq(a, production, rcond=None)[0][0]
+        slopes = dict(zip(gas_species, slopes))
+        for molecule in products:
+            results['tof'][molecule] = max(float(slopes[molecule]) / area, 1.0e-6)
+        for main, secondary in selectivity.items():
+            tof_total = (slopes[main] + sum(slopes[molecule] for molecule in secondary)) / area
+            if tof_total < 1.0e-6:
+                results['selectivity'][main] = float('NaN')
+            else:
+                mol_main = production[-1, gas_species.index(main)] - production[0, gas_species.index(main)]
+                mol_total = sum(production[-1, gas_species.index(molecule)] - production[0, gas_species.index(molecule)]
+                                for molecule in [main] + list(secondary))
+                results['selectivity'][main] = float(mol_main / mol_total * 100)
+
+    for species in surf_species:
+        coverage = float(np.mean(data[index:, header.index(species)]))
+        results['coverage'][species] = coverage / n_sites if n_sites is not None else coverage
+    return results
+
+
+def get_process_statistics(path, ignore=0.2, steps=None):
+    """Calculates the event frequency of each elementary step from procstat_output.txt, over the time window that
+    starts at final_time * ignore.
+
+    Arguments:
+        path (str): The path of the job
+        ignore (float): Fraction of the simulation time that is discarded
+        steps (list): Names of the reversible steps (e.g. ReactionModel.df.index), used to order the rows. By default
+            all steps found in procstat_output.txt
+
+    Returns a dataframe with one row per step and the columns rate_fwd, rate_rev and net_rate (events/s),
+    ratio (rate_fwd / rate_rev) and pe_index (rate_fwd / (rate_fwd + rate_rev), 0.5 for a step in partial
+    equilibrium).
+    """
+    names, (t_start, t_end), (occurrences_start, occurrences_end) = read_procstat_window(path, ignore=ignore)
+    if t_end <= t_start:
+        sys.exit(f"ERROR: not enough snapshots in procstat_output.txt")
+    rates = (occurrences_end - occurrences_start) / (t_end - t_start)
+    rates = dict(zip(names, rates))
+    if steps is None:
+        steps = list(dict.fromkeys(name[:-4] if name.endswith(('_fwd', '_rev')) else name for name in names))
+    rate_fwd = np.array([rates.get(f"{step}_fwd", rates.get(step, 0.0)) for step in steps], dtype=float)
+    rate_rev = np.array([rates.get(f"{step}_rev", 0.0) for step in steps], dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = rate_fwd / rate_rev
+        pe_index = rate_fwd / (rate_fwd + rate_rev)
+    return pd.DataFrame({'rate_fwd': rate_fwd, 'rate_rev': rate_rev, 'net_rate': rate_fwd - rate_rev,
+                         'ratio': ratio, 'pe_index': pe_index}, index=steps)
+
+
+def get_site_occupancy(path, ignore=0.2):
+    """Calculates, for each lattice site, the fraction of snapshots of history_output.txt in which it is occupied by
+    each surface species, reading one snapshot at a time. Only snapshots after final_time * ignore are used.
+
+    Returns a dataframe with one row per site and one column per surface species (plus '*' for empty sites).
+    """
+    surf_species = read_history_header(path)['surf_species']
+    n_species = len(surf_species) + 1  # species 0 is an empty site
+    offsets, times = get_history_index(path)
+    if len(times) == 0:
+        sys.exit(f"ERROR: no complete snapshots in {path}/history_output.txt")
+    first = int(np.searchsorted(times, times[-1] * ignore))
+    counts = None
+    for time, lattice_state, gas_counts in iter_history(path, start=first):
+        index = (lattice_state[:, 0] - 1) * n_species + lattice_state[:, 2]
+        snapshot_counts = np.bincount(index, minlength=len(lattice_state) * n_species)
+        counts = snapshot_counts if counts is None else counts + snapshot_counts
+    occupancy = counts.reshape(-1, n_species) / (len(times) - first)
+    return pd.DataFrame(occupancy, index=np.arange(1, len(occupancy) + 1), columns=['*'] + surf_species)
+
+
+def get_block_rates(time, production, n_blocks=20):
+    """Splits the time into n_blocks blocks of equal length and returns the production rate (slope) in each block.
+    Blocks without data are skipped.
+
+    Returns the start time of each block and the rates (2D array if production has several columns).
+    """
+    if len(time) < 2:  # e.g. a job that has just started
+        return np.empty(0), np.empty((0,) + production.shape[1:])
+    edges = np.linspace(time[0], time[-1], n_blocks + 1)
+    index = np.unique(np.clip(np.searchsorted(time, edges), 0, len(time) - 1))
+    block_time = np.diff(time[index])
+    valid = block_time > 0
+    rates = np.diff(production[index], axis=0)[valid] / (block_time[valid] if production.ndim == 1
+                                                         else block_time[valid, np.newaxis])
+    return time[index[:-1]][valid], rates
+
+
+def get_steady_state_block(rates):
+    """Returns the number of initial blocks to discard before the steady state, using the marginal standard error
+    rule (MSER): the truncation that minimises the variance of the remaining blocks divided by their number squared.
+    At most half of the blocks are discarded."""
+    n = len(rates)
+    if n < 4:
+        return 0
+    remaining = n - np.arange(n // 2 + 1)
+    reverse_sum = np.cumsum(rates[::-1])[::-1][:n // 2 + 1]
+    reverse_sum_2 = np.cumsum(rates[::-1] ** 2)[::-1][:n // 2 + 1]
+    variance = reverse_sum_2 / remaining - (reverse_sum / remaining) ** 2
+    return int(np.argmin(variance / remaining ** 2))
+
+
+def get_block_estimate(time, production, area=1.0, n_blocks=20, tolerance=0.05, min_blocks=5):
+    """Estimates a TOF and its standard error with batch means, after discarding the initial transient.
+
+    Arguments:
+        time (np.ndarray): KMC time
+        production (np.ndarray): Number of molecules produced at each time
+        area (float): The lattice surface area in Å2
+        n_blocks (int): Number of blocks the simulation time is split into
+        tolerance (float): Maximum relative standard error for the TOF to be considered converged
+        min_blocks (int): Minimum number of steady-state blocks for the TOF to be considered converged
+
+    Returns a dictionary with the TOF (tof), its standard error (tof_error), the time at which the steady state
+    starts (steady_state_time), the number of blocks used (n_blocks) and whether the TOF is converged (converged).
+    """
+    block_start, rates = get_block_rates(time, production, n_blocks=n_blocks)
+    if len(rates) == 0:
+        return {'tof': float('NaN'), 'tof_error': float('NaN'), 'steady_state_time': float('NaN'), 'n_blocks': 0,
+                'converged': False}
+    first = get_steady_state_block(rates)
+    rates = rates[first:] / area
+    tof = float(np.mean(rates))
+    tof_error = float(np.std(rates, ddof=1) / np.sqrt(len(rates))) if len(rates) > 1 else float('inf')
+    converged = len(rates) >= min_blocks and tof > 0 and tof_error / tof <= tolerance
+    return {'tof': tof, 'tof_error': tof_error, 'steady_state_time': float(block_start[first]),
+            'n_blocks': len(rates), 'converged': bool(converged)}
+
+
+def get_tof_estimate(path, molecule, area, n_blocks=20, tolerance=0.05, min_blocks=5, cache=False):
+    """Estimates the TOF of a molecule with its standard error and steady-state time (see get_block_estimate). It
+    can be used on a running simulation to decide if it can be stopped.
+
+    Example:
+    >>> get_tof_estimate(path='./co_oxidation_500K', molecule='CO2', area=665.39)
+    {'tof': 1.49, 'tof_error': 0.01, 'steady_state_time': 0.1, 'n_blocks': 19, 'converged': True}
+    """
+    header, data = read_specnum(path, columns=['Time', molecule], cache=cache)
+    return get_block_estimate(data[:, 0], data[:, 1], area=area, n_blocks=n_blocks, tolerance=tolerance,
+                              min_blocks=min_blocks)
+
+
+def get_selectivity_estimate(path, main, secondary, n_blocks=20, cache=False):
+    """Estimates the selectivity (%) towards main with batch means, after discarding the initial transient.
+
+    Returns a dictionary with the selectivity, its standard error (selectivity_error) and the time at which the
+    steady state starts (steady_state_time).
+    """
+    header, data = read_specnum(path, columns=['Time', main] + list(secondary), cache=cache)
+    production = np.column_stack([data[:, 1], data[:, 1:].sum(axis=1)])  # main, total
+    block_start, rates = get_block_rates(data[:, 0], production, n_blocks=n_blocks)
+    valid = rates[:, 1] > 0
+    if not valid.any():
+        return {'selectivity': float('NaN'), 'selectivity_error': float('NaN'), 'steady_state_time': float('NaN')}
+    block_start, rates = block_start[valid], rates[valid]
+    first = get_steady_state_block(rates[:, 1])
+    selectivity = rates[first:, 0] / rates[first:, 1] * 100
+    selectivity_error = np.std(selectivity, ddof=1) / np.sqrt(len(selectivity)) if len(selectivity) > 1 \
+        else float('inf')
+    return {'selectivity': float(np.mean(selectivity)), 'selectivity_error': float(selectivity_error),
+            'steady_state_time': float(block_start[first])}
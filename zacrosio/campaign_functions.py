@@ -0,0 +1,107 @@
+import os
+import glob
+import json
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from zacrosio.kmc_job import KMCJob
+from zacrosio.read_functions import get_data_from_simulation_input
+
+
+def get_signature(path):
+    """Returns the size and modification time of the output files of a job, used to detect if it has changed."""
+    signature = {}
+    for file_name in ['general_output.txt', 'specnum_output.txt']:
+        if os.path.isfile(f"{path}/{file_name}"):
+            stat = os.stat(f"{path}/{file_name}")
+            signature[file_name] = [stat.st_size, stat.st_mtime_ns]
+    return signature
+
+
+def collect_job(path, metrics):
+    """Returns a dictionary with the conditions and the requested metrics of one job (one row of the campaign
+    dataframe)."""
+    row = {'path': path}
+    if os.path.isfile(f"{path}/simulation_input.dat"):
+        row.update(get_data_from_simulation_input(path))
+    if not os.path.isfile(f"{path}/general_output.txt"):
+        row['status'] = 'not_started'
+        return row
+    job = KMCJob(path)
+    try:
+        if not job.finished:
+            row['status'] = 'not_finished'
+            return row
+        results = job.analyze(**metrics)
+    except (OSError, ValueError, IndexError, SystemExit):
+        row['status'] = 'error'
+        return row
+    row['status'] = 'finished'
+    for metric, values in results.items():
+        for name, value in values.items():
+            row[f"{metric}_{name}"] = value
+    return row
+
+
+def _collect_job(args):
+    return collect_job(*args)
+
+
+def collect_campaign(root_glob, metrics=None, workers=None, manifest_path=None):
+    """Collects the conditions and results of many KMC jobs into a single dataframe, using a pool of processes.
+
+    Arguments:
+        root_glob (str): Glob pattern matching the job directories, e.g. './co_oxidation_*K'
+        metrics (dict): Keyword arguments passed to KMCJob.analyze, e.g. {'products': ['CO2'], 'ignore': 0.2}. Add
+            'cache': False to avoid writing specnum caches into the job directories (e.g. read-only result trees)
+        workers (int): Number of processes (default: number of CPUs). If 1, no pool is used
+        manifest_path (str): JSON file where the results of each job are stored, so that jobs whose output files have
+            not changed are not analysed again on the next call. Default is .campaign_manifest.json in the common
+            parent directory of the jobs
+
+    Returns a dataframe with one row per job, indexed by path.
+
+    Example:
+    >>> df = collect_campaign('./co_oxidation_*K', metrics={'products': ['CO2'], 'ignore': 0.2}, workers=16)
+    """
+    if metrics is None:
+        metrics = {}
+    list_paths = sorted(path for path in glob.glob(root_glob) if os.path.isdir(path))
+    if not list_paths:
+        return pd.DataFrame()
+    if manifest_path is None:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in list_paths])
+        manifest_path = f"{root}/.campaign_manifest.json"
+    metrics_key = json.dumps(metrics, sort_keys=True)
+    manifest = {}
+    if os.path.isfile(manifest_path):
+        with open(manifest_path, 'r') as infile:
+            manifest = json.load(infile)
+        if manifest.get('metrics') != metrics_key:
+            manifest = {}
+    jobs = manifest.get('jobs', {})
+
+    rows = {}
+    signatures = {path: get_signature(path) for path in list_paths}
+    pending = []
+    for path in list_paths:
+        entry = jobs.get(path)
+        if entry is not None and entry['signature'] == signatures[path] and entry['row']['status'] == 'finished':
+            rows[path] = entry['row']
+        else:
+            pending.append(path)
+
+    if workers == 1:
+        results = [collect_job(path, metrics) for path in pending]
+    else:
+        chunksize = max(1, len(pending) // (4 * (workers or os.cpu_count())))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_collect_job, [(path, metrics) for path in pending], chunksize=chunksize))
+    for path, row in zip(pending, results):
+        rows[path] = row
+
+    manifest = {'metrics': metrics_key,
+                'jobs': {path: {'signature': signatures[path], 'row': rows[path]} for path in list_paths}}
+    with open(f"{manifest_path}.tmp", 'w') as outfile:
+        json.dump(manifest, outfile, default=float)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+    return pd.DataFrame([rows[path] for path in list_paths]).set_index('path')
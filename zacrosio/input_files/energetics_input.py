@@ -1,6 +1,7 @@
 import ast
 import pandas as pd
-from zacrosio.input_functions import write_header
+from zacrosio.input_functions import get_header
+from zacrosio.profiling_functions import profile
 
 
 class EnergeticModel:
@@ -8,29 +9,43 @@ class EnergeticModel:
 
     def __init__(self, df):
         self.df = df
+        self._text = None
+        self._text_df = None
 
+    @profile()
     def write(self, path):
         """Writes the energetics_input.dat file"""
-        write_header(f"{path}/energetics_input.dat")
-        with open(f"{path}/energetics_input.dat", 'a') as infile:
-            infile.write('energetics\n\n')
-            infile.write('############################################################################\n\n')
-            for cluster in [x for x in self.df.index if '_gas' not in x]:
-                infile.write(f"cluster {cluster}\n\n")
-                infile.write(f"  sites {int(self.df.loc[cluster, 'sites'])}\n")
-                if not pd.isnull(self.df.loc[cluster, 'neighboring']):
-                    infile.write(f"  neighboring {self.df.loc[cluster, 'neighboring']}\n")
-                infile.write(f"  lattice_state\n")
-                lattice_state_list = ast.literal_eval(self.df.loc[cluster, 'lattice_state'])
-                for element in lattice_state_list:
-                    infile.write(f"    {element}\n")
-                infile.write(f"  site_types {self.df.loc[cluster, 'site_types']}\n")
-                if not pd.isnull(self.df.loc[cluster, 'graph_multiplicity']):
-                    infile.write(f"  graph_multiplicity {int(self.df.loc[cluster, 'graph_multiplicity'])}\n")
-                if not pd.isnull(self.df.loc[cluster, 'angles']):
-                    infile.write(f"  angles {self.df.loc[cluster, 'angles']}\n")
-                # todo: add column optional keywords (e.g. no_mirror_images)
-                infile.write(f"  cluster_eng {self.df.loc[cluster, 'cluster_eng']:.2f}\n\n")
-                infile.write(f"end_cluster\n\n")
-                infile.write('############################################################################\n\n')
-            infile.write(f"end_energetics\n")
+        with open(f"{path}/energetics_input.dat", 'w') as infile:
+            infile.write(self.render())
+
+    def render(self):
+        """Returns the content of the energetics_input.dat file as a string. It does not depend on the temperature, so
+        it is only rendered again when the content of self.df changes (including in-place edits)."""
+        if self._text is not None and self.df.equals(self._text_df):
+            return self._text
+        text = [get_header(), 'energetics\n\n',
+                '############################################################################\n\n']
+        for cluster, row in zip(self.df.index, self.df.to_dict('records')):
+            if '_gas' in cluster:
+                continue
+            text.append(f"cluster {cluster}\n\n")
+            text.append(f"  sites {int(row['sites'])}\n")
+            if not pd.isnull(row['neighboring']):
+                text.append(f"  neighboring {row['neighboring']}\n")
+            text.append(f"  lattice_state\n")
+            lattice_state_list = ast.literal_eval(row['lattice_state'])
+            for element in lattice_state_list:
+                text.append(f"    {element}\n")
+            text.append(f"  site_types {row['site_types']}\n")
+            if not pd.isnull(row['graph_multiplicity']):
+                text.append(f"  graph_multiplicity {int(row['graph_multiplicity'])}\n")
+            if not pd.isnull(row['angles']):
+                text.append(f"  angles {row['angles']}\n")
+            # todo: add column optional keywords (e.g. no_mirror_images)
+            text.append(f"  cluster_eng {row['cluster_eng']:.2f}\n\n")
+            text.append(f"end_cluster\n\n")
+            text.append('############################################################################\n\n')
+        text.append(f"end_energetics\n")
+        self._text = ''.join(text)
+        self._text_df = self.df.copy()
+        return self._text
@@ -1,20 +1,160 @@
+import sys
+import numpy as np
+from zacrosio.profiling_functions import profile
+
+neighbor_directions = {'self': (0, 0), 'north': (0, 1), 'northeast': (1, 1), 'east': (1, 0), 'southeast': (1, -1)}
+
 
 class LatticeModel:
-    """Read an existing lattice_input.dat file and store it as a LatticeModel object"""
+    """Read an existing lattice_input.dat file and store it as a LatticeModel object
+
+    For periodic_cell lattices, the unit cell is also parsed into NumPy arrays: cell_vectors (2x2, Å), repeat_cell,
+    site_type_names, site_types (type of each site in the unit cell), site_coordinates (fractional) and the
+    neighboring structure (neighbor_pairs, zero-based sites of the unit cell, and neighbor_offsets, in cells).
+    """
 
     def __init__(self, path):
         with open(path, 'r') as infile:
             lines = infile.readlines()
         self._lines = lines
+        self._text = {}
+        self._graphs = {}
+        self.lattice_type = None
+        self.cell_vectors = None
+        self.repeat_cell = None
+        self.site_type_names = []
+        self.site_types = []
+        self.site_coordinates = None
+        self.neighbor_pairs = None
+        self.neighbor_offsets = None
+        self.parse()
 
-    def write(self, path):
-        """Write the lattice_input.dat file."""
+    def parse(self):
+        """Parse the unit cell of a periodic_cell lattice from the lines of the file."""
+        lines = [line.split('#')[0].split() for line in self._lines]
+        lines = [line for line in lines if line]
+        i = 0
+        neighbor_pairs, neighbor_offsets = [], []
+        while i < len(lines):
+            keyword = lines[i][0]
+            if keyword == 'lattice':
+                self.lattice_type = lines[i][1]
+            elif keyword == 'cell_vectors':
+                self.cell_vectors = np.array(lines[i + 1:i + 3], dtype=float)
+                i += 2
+            elif keyword == 'repeat_cell':
+                self.repeat_cell = np.array(lines[i][1:3], dtype=int)
+            elif keyword == 'site_type_names':
+                self.site_type_names = lines[i][1:]
+            elif keyword == 'site_types':
+                self.site_types = lines[i][1:]
+            elif keyword == 'site_coordinates':
+                n_cell_sites = len(self.site_types)
+                self.site_coordinates = np.array(lines[i + 1:i + 1 + n_cell_sites], dtype=float)
+                i += n_cell_sites
+            elif keyword == 'neighboring_structure':
+                i += 1
+                while lines[i][0] != 'end_neighboring_structure':
+                    site_1, site_2 = lines[i][0].split('-')
+                    neighbor_pairs.append((int(site_1) - 1, int(site_2) - 1))
+                    neighbor_offsets.append(neighbor_directions[lines[i][1]])
+                    i += 1
+            i += 1
+        if neighbor_pairs:
+            self.neighbor_pairs = np.array(neighbor_pairs, dtype=int)
+            self.neighbor_offsets = np.array(neighbor_offsets, dtype=int)
+        self._graphs = {}
+
+    @profile()
+    def write(self, path, size=None):
+        """Write the lattice_input.dat file. If size is given, the repeat_cell tag is replaced in the written file
+        only, without modifying the LatticeModel."""
         with open(f"{path}/lattice_input.dat", 'w') as infile:
-            for line in self._lines:
-                infile.write(line)
+            infile.write(self.render(size=size))
+
+    def render(self, size=None):
+        """Return the content of the lattice_input.dat file as a string. The result is cached for each size."""
+        key = None if size is None else tuple(size)
+        if key not in self._text:
+            self._text[key] = ''.join(self.get_lines(size=size))
+        return self._text[key]
+
+    def get_lines(self, size=None):
+        """Return the lines of the lattice_input.dat file, with the repeat_cell tag replaced if size is given."""
+        if size is None:
+            return list(self._lines)
+        return [f'   repeat_cell {size[0]} {size[1]}\n' if 'repeat_cell' in line else line for line in self._lines]
 
     def update_size(self, size):
         """Modify the value of repeat_cell tag."""
+        self._text = {}
         for i, line in enumerate(self._lines):
             if 'repeat_cell' in line:
                 self._lines[i] = f'   repeat_cell {size[0]} {size[1]}\n'
+        self.repeat_cell = np.array(size[:2], dtype=int)
+
+    def check_periodic_cell(self):
+        if self.lattice_type != 'periodic_cell':
+            sys.exit(f"ERROR: only periodic_cell lattices can be parsed (found {self.lattice_type})")
+
+    @property
+    def n_cell_sites(self):
+        return len(self.site_types)
+
+    def get_n_sites(self, size=None):
+        """Return the total number of lattice sites for a given repeat_cell (default: the one in the file)."""
+        self.check_periodic_cell()
+        size = self.repeat_cell if size is None else size
+        return int(self.n_cell_sites * size[0] * size[1])
+
+    def get_area(self, size=None):
+        """Return the lattice surface area in Å2 for a given repeat_cell (default: the one in the file)."""
+        self.check_periodic_cell()
+        size = self.repeat_cell if size is None else size
+        return float(abs(np.linalg.det(self.cell_vectors)) * size[0] * size[1])
+
+    def get_repeat_cell(self, n_sites):
+        """Return the repeat_cell with at least n_sites sites whose supercell is closest to a square."""
+        self.check_periodic_cell()
+        lengths = np.linalg.norm(self.cell_vectors, axis=1)
+        n_cells = n_sites / self.n_cell_sites
+        size_x = max(1, int(np.ceil(np.sqrt(n_cells * lengths[1] / lengths[0]))))
+        size_y = max(1, int(np.ceil(n_cells / size_x)))
+        return [size_x, size_y]
+
+    def get_lattice(self, size=None):
+        """Return the expanded periodic lattice for a given repeat_cell (default: the one in the file). The result is
+        cached for each size.
+
+        Sites are numbered cell by cell (the second cell index runs fastest), starting at 1 as in ZACROS.
+
+        Returns a dictionary with the cartesian coordinates of each site ('coordinates', Å), the index of its site
+        type in site_type_names ('site_types') and the pairs of neighboring sites ('neighbors', one row per pair).
+        """
+        self.check_periodic_cell()
+        size = tuple(int(x) for x in (self.repeat_cell if size is None else size))
+        if size in self._graphs:
+            return self._graphs[size]
+        n_x, n_y = size
+        n_cell_sites = self.n_cell_sites
+        cell_x, cell_y = np.meshgrid(np.arange(n_x), np.arange(n_y), indexing='ij')
+        cell_x, cell_y = cell_x.ravel(), cell_y.ravel()
+
+        fractional = (np.stack([cell_x, cell_y], axis=1)[:, np.newaxis, :]
+                      + self.site_coordinates[np.newaxis, :, :]).reshape(-1, 2)
+        coordinates = fractional @ self.cell_vectors
+        type_index = np.array([self.site_type_names.index(x) for x in self.site_types], dtype=int)
+        site_types = np.tile(type_index, n_x * n_y)
+
+        neighbors = np.empty((0, 2), dtype=int)
+        if self.neighbor_pairs is not None:
+            cell = (cell_x * n_y + cell_y)[:, np.newaxis]
+            neighbor_cell = (((cell_x[:, np.newaxis] + self.neighbor_offsets[:, 0]) % n_x) * n_y
+                             + (cell_y[:, np.newaxis] + self.neighbor_offsets[:, 1]) % n_y)
+            site_1 = cell * n_cell_sites + self.neighbor_pairs[:, 0] + 1
+            site_2 = neighbor_cell * n_cell_sites + self.neighbor_pairs[:, 1] + 1
+            neighbors = np.stack([site_1.ravel(), site_2.ravel()], axis=1)
+
+        lattice = {'coordinates': coordinates, 'site_types': site_types, 'neighbors': neighbors}
+        self._graphs[size] = lattice
+        return lattice
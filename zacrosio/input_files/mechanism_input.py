@@ -1,6 +1,8 @@
 import ast
+import numpy as np
 import pandas as pd
-from zacrosio.input_functions import write_header, calc_ads, calc_surf_proc
+from zacrosio.input_functions import get_header, calc_ads, calc_surf_proc, calc_ads_array, calc_surf_proc_array
+from zacrosio.profiling_functions import profile
 
 
 class ReactionModel:
@@ -8,46 +10,78 @@ class ReactionModel:
 
     def __init__(self, df):
         self.df = df
+        self._parsed_steps = None
+        self._parsed_df = None
+        self._parsed_gas = None
+        self._template = None
+        self._template_df = None
 
-    def write(self, path, T, df_gas, dict_manual_scaling, list_auto_scaling):
-        """Writes the mechanism_input.dat file"""
-        write_header(f"{path}/mechanism_input.dat")
-        with open(f"{path}/mechanism_input.dat", 'a') as infile:
-            infile.write('mechanism\n\n')
-            infile.write('############################################################################\n\n')
-            for step in self.df.index:
-                infile.write(f"reversible_step {step}\n\n")
-                if not pd.isna(self.df.loc[step, 'molecule']):
-                    infile.write(f"  gas_reacs_prods {self.df.loc[step, 'molecule']} -1\n")
-                infile.write(f"  sites {int(self.df.loc[step, 'sites'])}\n")
-                if not pd.isnull(self.df.loc[step, 'neighboring']):
-                    infile.write(f"  neighboring {self.df.loc[step, 'neighboring']}\n")
-                infile.write(f"  initial\n")
-                initial_state_list = ast.literal_eval(self.df.loc[step, 'initial'])
-                for element in initial_state_list:
-                    infile.write(f"    {element}\n")
-                infile.write(f"  final\n")
-                final_state_list = ast.literal_eval(self.df.loc[step, 'final'])
-                for element in final_state_list:
-                    infile.write(f"    {element}\n")
-                infile.write(f"  site_types {self.df.loc[step, 'site_types']}\n")
-                pre_expon, pe_ratio = self.get_pre_expon(step=step, T=T, df_gas=df_gas,
-                                                         dict_manual_scaling=dict_manual_scaling)
-                if step in dict_manual_scaling:
-                    infile.write(f"  pre_expon {pre_expon:.3e}   # scaled 1e-{dict_manual_scaling[step]}\n")
-                else:
-                    infile.write(f"  pre_expon {pre_expon:.3e}\n")
-                infile.write(f"  pe_ratio {pe_ratio:.3e}\n")
-                infile.write(f"  activ_eng {self.df.loc[step, 'activ_eng']:.2f}\n")
-                for keyword in ['prox_factor', 'angles']:  # optional keywords
-                    if not pd.isnull(self.df.loc[step, keyword]):
-                        infile.write(f"  {keyword} {self.df.loc[step, keyword]}\n")
-                if step in list_auto_scaling:
-                    infile.write(f"  stiffness_scalable \n")
-                # todo: add possibility of including no_mirror_images (maybe column with additional flags)
-                infile.write(f"\nend_reversible_step\n\n")
-                infile.write('############################################################################\n\n')
-            infile.write(f"end_mechanism\n")
+    @profile()
+    def write(self, path, T, df_gas, dict_manual_scaling, list_auto_scaling, dict_pre_expon=None):
+        """Writes the mechanism_input.dat file
+
+        If dict_pre_expon is given ({step: (pre_expon, pe_ratio)}, e.g. from get_pre_expon_array), those values are
+        written instead of being calculated again for each step."""
+        with open(f"{path}/mechanism_input.dat", 'w') as infile:
+            infile.write(self.render(T=T, df_gas=df_gas, dict_manual_scaling=dict_manual_scaling,
+                                     list_auto_scaling=list_auto_scaling, dict_pre_expon=dict_pre_expon))
+
+    def render(self, T, df_gas, dict_manual_scaling, list_auto_scaling, dict_pre_expon=None):
+        """Returns the content of the mechanism_input.dat file as a string. Only the temperature-dependent fields are
+        filled in here; the rest of each step comes from the template compiled by compile_template."""
+        if dict_pre_expon is None:
+            df_pre_expon, df_pe_ratio = self.get_pre_expon_array(T=[T], df_gas=df_gas,
+                                                                 dict_manual_scaling=dict_manual_scaling)
+            dict_pre_expon = {step: (df_pre_expon.iat[i, 0], df_pe_ratio.iat[i, 0])
+                              for i, step in enumerate(df_pre_expon.index)}
+        text = [get_header(), 'mechanism\n\n',
+                '############################################################################\n\n']
+        for step, head, tail in self.compile_template():
+            pre_expon, pe_ratio = dict_pre_expon[step]
+            text.append(head)
+            if step in dict_manual_scaling:
+                text.append(f"  pre_expon {pre_expon:.3e}   # scaled 1e-{dict_manual_scaling[step]}\n")
+            else:
+                text.append(f"  pre_expon {pre_expon:.3e}\n")
+            text.append(f"  pe_ratio {pe_ratio:.3e}\n")
+            text.append(tail)
+            if step in list_auto_scaling:
+                text.append(f"  stiffness_scalable \n")
+            # todo: add possibility of including no_mirror_images (maybe column with additional flags)
+            text.append(f"\nend_reversible_step\n\n")
+            text.append('############################################################################\n\n')
+        text.append(f"end_mechanism\n")
+        return ''.join(text)
+
+    def compile_template(self):
+        """Renders the temperature-independent parts of every step once and caches them. Returns a list of
+        (step, text before pre_expon, text after pe_ratio). The template is compiled again whenever the content of
+        self.df changes (including in-place edits)."""
+        if self._template is not None and self.df.equals(self._template_df):
+            return self._template
+        template = []
+        for step, row in zip(self.df.index, self.df.to_dict('records')):
+            head = [f"reversible_step {step}\n\n"]
+            if not pd.isna(row['molecule']):
+                head.append(f"  gas_reacs_prods {row['molecule']} -1\n")
+            head.append(f"  sites {int(row['sites'])}\n")
+            if not pd.isnull(row['neighboring']):
+                head.append(f"  neighboring {row['neighboring']}\n")
+            head.append(f"  initial\n")
+            for element in ast.literal_eval(row['initial']):
+                head.append(f"    {element}\n")
+            head.append(f"  final\n")
+            for element in ast.literal_eval(row['final']):
+                head.append(f"    {element}\n")
+            head.append(f"  site_types {row['site_types']}\n")
+            tail = [f"  activ_eng {row['activ_eng']:.2f}\n"]
+            for keyword in ['prox_factor', 'angles']:  # optional keywords
+                if not pd.isnull(row[keyword]):
+                    tail.append(f"  {keyword} {row[keyword]}\n")
+            template.append((step, ''.join(head), ''.join(tail)))
+        self._template = template
+        self._template_df = self.df.copy()
+        return template
 
     def get_pre_expon(self, step, T, df_gas, dict_manual_scaling):
         """Calculates the forward pre-exponential and the pre-exponential ratio, required for the mechanism_input.dat
@@ -75,3 +109,68 @@ class ReactionModel:
             pe_rev = pe_rev * 10 ** (-dict_manual_scaling[step])
         pe_ratio = pe_fwd / pe_rev
         return pe_fwd, pe_ratio
+
+    def parse(self, df_gas):
+        """Parses the vibrational modes and gas-phase data of every step into NumPy arrays. The result is cached, so
+        the dataframes are only parsed again when the content of self.df or df_gas changes."""
+        if self._parsed_steps is not None and self.df.equals(self._parsed_df) and df_gas.equals(self._parsed_gas):
+            return self._parsed_steps
+        parsed_steps = {}
+        for step in self.df.index:
+            data = {'vib_is': np.array(ast.literal_eval(self.df.loc[step, 'vib_list_is']), dtype=float),
+                    'vib_ts': np.array(ast.literal_eval(self.df.loc[step, 'vib_list_ts']), dtype=float),
+                    'vib_fs': np.array(ast.literal_eval(self.df.loc[step, 'vib_list_fs']), dtype=float)}
+            if not pd.isna(self.df.loc[step, 'molecule']):  # adsorption
+                molecule = self.df.loc[step, 'molecule']
+                data['molecule'] = molecule
+                data['A_site'] = float(self.df.loc[step, 'A_site'])
+                data['molec_mass'] = float(df_gas.loc[molecule, 'gas_molec_weight'])
+                data['inertia_moments'] = np.array(ast.literal_eval(df_gas.loc[molecule, 'inertia_list']),
+                                                   dtype=float)
+                data['sym_number'] = int(df_gas.loc[molecule, 'sym_number'])
+                data['degeneracy'] = int(df_gas.loc[molecule, 'degeneracy'])
+            else:  # surface process
+                data['molecule'] = None
+            parsed_steps[step] = data
+        self._parsed_steps = parsed_steps
+        self._parsed_df = self.df.copy()
+        self._parsed_gas = df_gas.copy()
+        return parsed_steps
+
+    @profile()
+    def get_pre_expon_array(self, T, df_gas, dict_manual_scaling=None):
+        """Calculates the forward pre-exponential and the pre-exponential ratio of all steps at an array of
+        temperatures in one vectorized pass.
+
+        Returns two dataframes (pre_expon, pe_ratio) with one row per step and one column per temperature.
+        """
+        if dict_manual_scaling is None:
+            dict_manual_scaling = {}
+        T = np.atleast_1d(np.asarray(T, dtype=float))
+        parsed_steps = self.parse(df_gas=df_gas)
+        pe_fwd_all = np.empty((len(parsed_steps), len(T)))
+        pe_ratio_all = np.empty((len(parsed_steps), len(T)))
+        for i, (step, data) in enumerate(parsed_steps.items()):
+            if data['molecule'] is not None:  # adsorption
+                pe_fwd, pe_rev = calc_ads_array(A_site=data['A_site'],
+                                                molec_mass=data['molec_mass'],
+                                                T=T,
+                                                vib_is=data['vib_is'],
+                                                vib_ts=data['vib_ts'],
+                                                vib_fs=data['vib_fs'],
+                                                inertia_moments=data['inertia_moments'],
+                                                sym_number=data['sym_number'],
+                                                degeneracy=data['degeneracy'])
+            else:  # surface process
+                pe_fwd, pe_rev = calc_surf_proc_array(T=T,
+                                                      vib_is=data['vib_is'],
+                                                      vib_ts=data['vib_ts'],
+                                                      vib_fs=data['vib_fs'])
+            if step in dict_manual_scaling:
+                pe_fwd = pe_fwd * 10 ** (-dict_manual_scaling[step])
+                pe_rev = pe_rev * 10 ** (-dict_manual_scaling[step])
+            pe_fwd_all[i] = pe_fwd
+            pe_ratio_all[i] = pe_fwd / pe_rev
+        df_pre_expon = pd.DataFrame(pe_fwd_all, index=list(parsed_steps), columns=T)
+        df_pe_ratio = pd.DataFrame(pe_ratio_all, index=list(parsed_steps), columns=T)
+        return df_pre_expon, df_pe_ratio
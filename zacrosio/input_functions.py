@@ -1,20 +1,26 @@
 import ast
 import sys
 from math import sqrt, exp
+import numpy as np
 from scipy.constants import pi, N_A, k, h, physical_constants
 
 k_eV = physical_constants["Boltzmann constant in eV/K"][0]
 atomic_mass = physical_constants["atomic mass constant"][0]
 
 
+def get_header():
+    """Returns the header written at the top of every input file."""
+    return ('############################################################################\n'
+            '# Zacros Input File generated with the ZacrosIOTools                       #\n'
+            '# https://github.com/hprats/ZacrosIOTools.git                              #\n'
+            '#                                                                          #\n'
+            '# Hector Prats, PhD                                                        #\n'
+            '############################################################################\n\n')
+
+
 def write_header(path):
     with open(path, 'w') as infile:
-        infile.write('############################################################################\n')
-        infile.write('# Zacros Input File generated with the ZacrosIOTools                       #\n')
-        infile.write('# https://github.com/hprats/ZacrosIOTools.git                              #\n')
-        infile.write('#                                                                          #\n')
-        infile.write('# Hector Prats, PhD                                                        #\n')
-        infile.write('############################################################################\n\n')
+        infile.write(get_header())
 
 
 def get_q_vib(T, vib_list):
@@ -80,3 +86,73 @@ def calc_surf_proc(T, vib_list_is, vib_list_ts, vib_list_fs):
     pe_fwd = (q_vib_ts / q_vib_initial) * (k * T / h)
     pe_rev = (q_vib_ts / q_vib_final) * (k * T / h)
     return pe_fwd, pe_rev
+
+
+def get_q_vib_array(T, vib_energies):
+    """Calculates the vibrational partition function (including ZPE) for an array of temperatures.
+
+    Arguments:
+        T (np.ndarray): The temperatures in K
+        vib_energies (np.ndarray): Vibrational modes in meV
+    """
+    T = np.asarray(T, dtype=float)
+    vib_energies = np.asarray(vib_energies, dtype=float)
+    if vib_energies.size == 0:
+        return np.ones_like(T)
+    x = vib_energies[:, np.newaxis] / (1000 * k_eV * T[np.newaxis, :])
+    return np.prod(np.exp(-x / 2) / (1 - np.exp(-x)), axis=0)
+
+
+def get_q_rot_array(T, inertia_moments, sym_number):
+    """Calculates the rotational partition function for an array of temperatures.
+
+    Arguments:
+        T (np.ndarray): The temperatures in K
+        inertia_moments (np.ndarray): Inertia moments (1 for linear, 3 for non-linear) in amu*Å2
+        sym_number (int): Symmetry number of the molecule
+    """
+    T = np.asarray(T, dtype=float)
+    inertia_moments = np.asarray(inertia_moments, dtype=float) * atomic_mass / 1.0e20  # from amu*Å2 to kg*m2
+    if len(inertia_moments) == 1:  # linear
+        q_rot_gas = 8 * pi ** 2 * inertia_moments[0] * k * T / (sym_number * h ** 2)
+    elif len(inertia_moments) == 3:  # non-linear
+        q_rot_gas = (sqrt(pi * np.prod(inertia_moments)) / sym_number) * (8 * pi ** 2 * k * T / h ** 2) ** (3 / 2)
+    else:
+        sys.exit(f"Invalid inertia_list")
+    return q_rot_gas
+
+
+def calc_ads_array(A_site, molec_mass, T, vib_is, vib_ts, vib_fs, inertia_moments, sym_number, degeneracy):
+    """Calculates the forward and reverse pre-exponential factors for a reversible adsorption at an array of
+    temperatures. Vibrational modes and inertia moments are given as already parsed arrays; an empty vib_ts means
+    non-activated adsorption."""
+    T = np.asarray(T, dtype=float)
+    A_site = A_site * 1.0e-20  # Å^2 to m^2
+    m = molec_mass * 1.0e-3 / N_A  # g/mol to kg/molec
+    q_vib_gas = get_q_vib_array(T=T, vib_energies=vib_is)
+    q_rot_gas = get_q_rot_array(T=T, inertia_moments=inertia_moments, sym_number=sym_number)
+    q_trans_2d_gas = A_site * 2 * pi * m * k * T / h ** 2
+    q_el_gas = degeneracy
+    q_vib_ads = get_q_vib_array(T=T, vib_energies=vib_fs)
+    if len(vib_ts) == 0:  # non-activated
+        pe_fwd = A_site / np.sqrt(2 * pi * m * k * T) * 1e5  # Pa-1 to bar-1
+        pe_rev = (q_el_gas * q_vib_gas * q_rot_gas * q_trans_2d_gas / q_vib_ads) * (k * T / h)
+    else:  # activated
+        q_vib_ts = get_q_vib_array(T=T, vib_energies=vib_ts)
+        pe_fwd = (q_vib_ts / (q_el_gas * q_vib_gas * q_rot_gas * q_trans_2d_gas)) * (
+                A_site / np.sqrt(2 * pi * m * k * T))
+        pe_fwd = pe_fwd * 1e5  # Pa-1 to bar-1
+        pe_rev = (q_vib_ts / q_vib_ads) * (k * T / h)
+    return pe_fwd, pe_rev
+
+
+def calc_surf_proc_array(T, vib_is, vib_ts, vib_fs):
+    """Calculates the forward and reverse pre-exponential factors for a reversible surface process at an array of
+    temperatures."""
+    T = np.asarray(T, dtype=float)
+    q_vib_initial = get_q_vib_array(T=T, vib_energies=vib_is)
+    q_vib_ts = get_q_vib_array(T=T, vib_energies=vib_ts)
+    q_vib_final = get_q_vib_array(T=T, vib_energies=vib_fs)
+    pe_fwd = (q_vib_ts / q_vib_initial) * (k * T / h)
+    pe_rev = (q_vib_ts / q_vib_final) * (k * T / h)
+    return pe_fwd, pe_rev
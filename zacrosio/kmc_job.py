@@ -1,12 +1,28 @@
 import os
+import sys
+import json
+import zlib
+import shutil
 import pandas as pd
 from random import randint
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import redirect_stdout
+from functools import cached_property
 from zacrosio.input_files.energetics_input import EnergeticModel
 from zacrosio.input_files.mechanism_input import ReactionModel
 from zacrosio.input_files.lattice_input import LatticeModel
-from zacrosio.input_functions import write_header
-from zacrosio.read_functions import read_file, check_finished, get_data_from_general_output
+from zacrosio.input_functions import get_header
+from zacrosio.read_functions import read_file, check_finished, get_data_from_general_output, read_specnum, \
+    read_specnum_header, parse_general_output, read_procstat, get_history_index, read_history_snapshot, iter_history
+from zacrosio.analysis_functions import get_tof, get_selectivity, analyze, get_process_statistics, \
+    get_site_occupancy
 from zacrosio.plot_functions import plt_production, plt_tof
+from zacrosio.profiling_functions import profile
+
+default_stiffness_scaling_tags = {'check_every': 5000,
+                                  'min_separation': 200.0,
+                                  'max_separation': 400.0,
+                                  'scaling_factor': 3.0}
 
 
 class NewKMCJob:
@@ -51,9 +67,16 @@ class NewKMCJob:
         self.energetic_model = EnergeticModel(df=df_energetics)
         self.lattice_model = LatticeModel(path=lattice_path)
 
+    @profile()
     def create_job_dir(self, path, T, simulation_tags, dict_pressure, repeat_cell=None, dict_manual_scaling=None,
-                       list_auto_scaling=None):
-        """Creates a new directory and writes there the ZACROS input files"""
+                       list_auto_scaling=None, dict_pre_expon=None, random_seed=None, stiffness_scaling_tags=None):
+        """Creates a new directory and writes there the ZACROS input files. Returns True if the directory was created
+        and False if it already existed.
+
+        dict_pre_expon ({step: (pre_expon, pe_ratio)}) can be used to pass pre-exponentials already calculated with
+        ReactionModel.get_pre_expon_array, e.g. when sweeping over many temperatures. If random_seed is None, a random
+        one is drawn. stiffness_scaling_tags overrides the default stiffness scaling keywords written when
+        list_auto_scaling is not empty (see default_stiffness_scaling_tags)."""
         if list_auto_scaling is None:
             list_auto_scaling = []
         if dict_manual_scaling is None:
@@ -62,66 +85,272 @@ class NewKMCJob:
         if not os.path.exists(self.path):
             os.mkdir(self.path)
             self.write_simulation(T=T, simulation_tags=simulation_tags, dict_pressure=dict_pressure,
-                                  list_auto_scaling=list_auto_scaling)
+                                  list_auto_scaling=list_auto_scaling, random_seed=random_seed,
+                                  stiffness_scaling_tags=stiffness_scaling_tags)
             self.reaction_model.write(path=self.path, T=T, df_gas=self.df_gas, dict_manual_scaling=dict_manual_scaling,
-                                      list_auto_scaling=list_auto_scaling)
+                                      list_auto_scaling=list_auto_scaling, dict_pre_expon=dict_pre_expon)
             self.energetic_model.write(path=self.path)
-            if repeat_cell is not None:
-                self.lattice_model.update_size(size=repeat_cell)
-            self.lattice_model.write(path=self.path)
+            self.lattice_model.write(path=self.path, size=repeat_cell)
+            return True
         else:
             print(f'{self.path} already exists (nothing done)')
+            return False
+
+    def create_job_dirs(self, list_of_conditions, workers=None, seed=0):
+        """Creates many job directories in parallel using a pool of processes.
+
+        Each element of list_of_conditions is a dictionary with the keyword arguments of create_job_dir (path, T,
+        simulation_tags, dict_pressure and optionally repeat_cell, dict_manual_scaling, list_auto_scaling and
+        random_seed). Pre-exponentials are calculated beforehand for all temperatures at once. Unless given, the
+        random seed of each job is derived from seed and the job path, so that recreating a campaign gives the same
+        seeds.
 
-    def write_simulation(self, T, simulation_tags, dict_pressure, list_auto_scaling):
+        Returns a dataframe (manifest) with one row per job, indicating if it was created or skipped.
+
+        Example:
+        >>> list_of_conditions = [{'path': f'./co_oxidation_{temp}K', 'T': temp, 'simulation_tags': simulation_tags,
+        >>>                        'dict_pressure': {'CO': 1.2, 'O2': 0.01}} for temp in range(400, 1000, 10)]
+        >>> manifest = my_job.create_job_dirs(list_of_conditions=list_of_conditions, workers=8)
+        """
+        list_of_conditions = [dict(conditions) for conditions in list_of_conditions]
+        # Calculate all pre-exponentials in one vectorized pass for each set of manual scaling factors
+        groups = {}
+        for conditions in list_of_conditions:
+            if conditions.get('dict_pre_expon') is None:
+                key = tuple(sorted((conditions.get('dict_manual_scaling') or {}).items()))
+                groups.setdefault(key, []).append(conditions)
+        for key, group in groups.items():
+            list_T = sorted(set(float(conditions['T']) for conditions in group))
+            df_pre_expon, df_pe_ratio = self.reaction_model.get_pre_expon_array(T=list_T, df_gas=self.df_gas,
+                                                                                dict_manual_scaling=dict(key))
+            for conditions in group:
+                T = float(conditions['T'])
+                conditions['dict_pre_expon'] = {step: (df_pre_expon.loc[step, T], df_pe_ratio.loc[step, T])
+                                                for step in df_pre_expon.index}
+        for conditions in list_of_conditions:
+            if conditions.get('random_seed') is None:
+                conditions['random_seed'] = get_random_seed(path=conditions['path'], seed=seed)
+
+        if workers == 1:
+            results = [_create_job_dir(self, conditions) for conditions in list_of_conditions]
+        else:
+            chunksize = max(1, len(list_of_conditions) // (4 * (workers or os.cpu_count())))
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(self,)) as executor:
+                results = list(executor.map(_create_job_dir_in_worker, list_of_conditions, chunksize=chunksize))
+        manifest = pd.DataFrame(
+            [{'path': conditions['path'], 'T': conditions['T'], 'random_seed': conditions['random_seed'],
+              'status': 'created' if created else 'skipped'}
+             for conditions, created in zip(list_of_conditions, results)])
+        return manifest
+
+    @profile()
+    def write_simulation(self, T, simulation_tags, dict_pressure, list_auto_scaling, random_seed=None,
+                         stiffness_scaling_tags=None):
         """Writes the simulation_input.dat file"""
+        if random_seed is None:
+            random_seed = randint(100000, 999999)
+        stiffness_scaling_tags = {**default_stiffness_scaling_tags, **(stiffness_scaling_tags or {})}
         gas_specs_names = [x for x in self.df_gas.index]
         surf_specs_names = [x.replace('_point', '') for x in self.energetic_model.df.index if '_point' in x]
         surf_specs_names = [x + '*' * int(self.energetic_model.df.loc[f'{x}_point', 'sites']) for x in surf_specs_names]
         surf_specs_dent = [x.count('*') for x in surf_specs_names]
-        write_header(f"{self.path}/simulation_input.dat")
-        with open(f"{self.path}/simulation_input.dat", 'a') as infile:
-            infile.write('random_seed\t'.expandtabs(26) + str(randint(100000, 999999)) + '\n')
-            infile.write('temperature\t'.expandtabs(26) + str(float(T)) + '\n')
-            p_tot = sum(dict_pressure.values())
-            infile.write('pressure\t'.expandtabs(26) + str(p_tot) + '\n')
-            infile.write('n_gas_species\t'.expandtabs(26) + str(len(gas_specs_names)) + '\n')
-            infile.write('gas_specs_names\t'.expandtabs(26) + " ".join(str(x) for x in gas_specs_names) + '\n')
-            tags_dict = ['gas_energy', 'gas_molec_weight']
-            tags_zacros = ['gas_energies', 'gas_molec_weights']
-            for tag1, tag2 in zip(tags_dict, tags_zacros):
-                tag_list = [self.df_gas.loc[x, tag1] for x in gas_specs_names]
-                infile.write(f'{tag2}\t'.expandtabs(26) + " ".join(str(x) for x in tag_list) + '\n')
-            gas_molar_frac_list = [dict_pressure[x] / p_tot for x in gas_specs_names]
-            infile.write(f'gas_molar_fracs\t'.expandtabs(26) + " ".join(str(x) for x in gas_molar_frac_list) + '\n')
-            infile.write('n_surf_species\t'.expandtabs(26) + str(len(surf_specs_names)) + '\n')
-            infile.write('surf_specs_names\t'.expandtabs(26) + " ".join(str(x) for x in surf_specs_names) + '\n')
-            infile.write('surf_specs_dent\t'.expandtabs(26) + " ".join(str(x) for x in surf_specs_dent) + '\n')
-            for tag in simulation_tags:
-                infile.write((tag + '\t').expandtabs(26) + str(simulation_tags[tag]) + '\n')
-            if len(list_auto_scaling) > 0:
-                infile.write(f"enable_stiffness_scaling\n")
-                infile.write(f"check_every 5000\n")
-                infile.write(f"min_separation 200.0\n")
-                infile.write(f"max_separation 400.0\n")
-                infile.write(f"scaling_factor 3.0\n")
-            infile.write(f"finish\n")
+        text = [get_header()]
+        text.append('random_seed\t'.expandtabs(26) + str(random_seed) + '\n')
+        text.append('temperature\t'.expandtabs(26) + str(float(T)) + '\n')
+        p_tot = sum(dict_pressure.values())
+        text.append('pressure\t'.expandtabs(26) + str(p_tot) + '\n')
+        text.append('n_gas_species\t'.expandtabs(26) + str(len(gas_specs_names)) + '\n')
+        text.append('gas_specs_names\t'.expandtabs(26) + " ".join(str(x) for x in gas_specs_names) + '\n')
+        tags_dict = ['gas_energy', 'gas_molec_weight']
+        tags_zacros = ['gas_energies', 'gas_molec_weights']
+        for tag1, tag2 in zip(tags_dict, tags_zacros):
+            tag_list = [self.df_gas.loc[x, tag1] for x in gas_specs_names]
+            text.append(f'{tag2}\t'.expandtabs(26) + " ".join(str(x) for x in tag_list) + '\n')
+        gas_molar_frac_list = [dict_pressure[x] / p_tot for x in gas_specs_names]
+        text.append(f'gas_molar_fracs\t'.expandtabs(26) + " ".join(str(x) for x in gas_molar_frac_list) + '\n')
+        text.append('n_surf_species\t'.expandtabs(26) + str(len(surf_specs_names)) + '\n')
+        text.append('surf_specs_names\t'.expandtabs(26) + " ".join(str(x) for x in surf_specs_names) + '\n')
+        text.append('surf_specs_dent\t'.expandtabs(26) + " ".join(str(x) for x in surf_specs_dent) + '\n')
+        for tag in simulation_tags:
+            text.append((tag + '\t').expandtabs(26) + str(simulation_tags[tag]) + '\n')
+        if len(list_auto_scaling) > 0:
+            text.append(f"enable_stiffness_scaling\n")
+            for tag in stiffness_scaling_tags:
+                text.append(f"{tag} {stiffness_scaling_tags[tag]}\n")
+        text.append(f"finish\n")
+        with open(f"{self.path}/simulation_input.dat", 'w') as infile:
+            infile.write(''.join(text))
+
+
+def get_random_seed(path, seed=0):
+    """Returns a deterministic random seed (between 100000 and 999999) for a given job path."""
+    return 100000 + zlib.crc32(f"{seed}:{os.path.normpath(path)}".encode()) % 900000
+
+
+_worker_job = None
+
+
+def _init_worker(job):
+    global _worker_job
+    _worker_job = job
+
+
+def _create_job_dir(job, conditions):
+    with open(os.devnull, 'w') as devnull, redirect_stdout(devnull):
+        return job.create_job_dir(**conditions)
+
+
+def _create_job_dir_in_worker(conditions):
+    return _create_job_dir(_worker_job, conditions)
 
 
 class KMCJob:
-    """A class that represents a finished KMC job with ZACROS."""
+    """A class that represents a finished KMC job with ZACROS.
+
+    Nothing is read when the object is created: each file is read the first time the corresponding attribute is
+    accessed and then kept in memory, until release() is called.
+    """
+
+    lazy_attributes = ['finished', 'lattice_input', 'lattice', 'general_output', 'basic_info', 'specnum', 'procstat',
+                       'history_index']
 
+    @profile()
     def __init__(self, path):
         self.path = path
-        self.finished = check_finished(path)
-
-        if self.finished:
-            # Read files
-            self.lattice_input = read_file(f"{path}/lattice_input.dat")
-            # Get basic info
-            n_surf_species, n_sites, area = get_data_from_general_output(path)
-            self.n_surf_species = n_surf_species
-            self.n_sites = n_sites
-            self.area = area
+
+    @cached_property
+    def finished(self):
+        return check_finished(self.path)
+
+    @cached_property
+    def lattice_input(self):
+        return read_file(f"{self.path}/lattice_input.dat")
+
+    @cached_property
+    def lattice(self):
+        """The lattice_input.dat file parsed as a LatticeModel."""
+        return LatticeModel(path=f"{self.path}/lattice_input.dat")
+
+    @cached_property
+    def general_output(self):
+        """All the data from the header of general_output.txt (see parse_general_output)."""
+        return parse_general_output(self.path)
+
+    @cached_property
+    def basic_info(self):
+        return get_data_from_general_output(self.path)
+
+    @property
+    def n_surf_species(self):
+        return self.basic_info[0]
+
+    @property
+    def n_sites(self):
+        return self.basic_info[1]
+
+    @property
+    def area(self):
+        return self.basic_info[2]
+
+    @cached_property
+    def specnum(self):
+        """Column names and data of specnum_output.txt (see get_specnum)."""
+        return self.get_specnum()
+
+    @cached_property
+    def procstat(self):
+        """Step names, times and occurrences of procstat_output.txt (see read_procstat)."""
+        return read_procstat(self.path)
+
+    @cached_property
+    def history_index(self):
+        """Byte offsets and times of the snapshots in history_output.txt (see get_history_index)."""
+        return get_history_index(self.path)
+
+    def get_snapshot(self, snapshot):
+        """Returns the time, lattice state and gas counts of a snapshot of history_output.txt (see
+        read_history_snapshot)."""
+        return read_history_snapshot(self.path, snapshot, index=self.history_index)
+
+    def iter_snapshots(self, start=0, stop=None, step=1):
+        return iter_history(self.path, start=start, stop=stop, step=step)
+
+    def get_site_occupancy(self, ignore=0.2):
+        return get_site_occupancy(path=self.path, ignore=ignore)
+
+    def create_continuation(self, path, max_time=None, max_steps=None, wall_time=None):
+        """Creates a new directory to continue this simulation from its restart.inf file, instead of starting again.
+
+        The input files and restart.inf are copied to the new directory and the given stopping criteria are updated in
+        simulation_input.dat. Once the continuation has run, reading its specnum_output.txt (e.g. with get_tof)
+        returns the output of the original job and of the continuation as one time series.
+
+        Example:
+        >>> job = KMCJob(path='./co_oxidation_500K')
+        >>> job.create_continuation(path='./co_oxidation_500K_2', max_time=4.0)
+        """
+        if not os.path.isfile(f"{self.path}/restart.inf"):
+            sys.exit(f"ERROR: {self.path}/restart.inf not found")
+        if os.path.exists(path):
+            print(f'{path} already exists (nothing done)')
+            return False
+        os.mkdir(path)
+        for file_name in os.listdir(self.path):
+            if file_name.endswith('_input.dat') or file_name == 'restart.inf':
+                shutil.copy(f"{self.path}/{file_name}", f"{path}/{file_name}")
+        new_tags = {tag: value for tag, value in [('max_time', max_time), ('max_steps', max_steps),
+                                                  ('wall_time', wall_time)] if value is not None}
+        with open(f"{path}/simulation_input.dat", 'r') as infile:
+            lines = infile.readlines()
+        for i, line in enumerate(lines):
+            tag = line.split()[0] if line.strip() else None
+            if tag in new_tags:
+                lines[i] = (tag + '\t').expandtabs(26) + str(new_tags.pop(tag)) + '\n'
+        finish = next(i for i, line in enumerate(lines) if line.strip() == 'finish')
+        lines[finish:finish] = [(tag + '\t').expandtabs(26) + str(value) + '\n' for tag, value in new_tags.items()]
+        with open(f"{path}/simulation_input.dat", 'w') as outfile:
+            outfile.write(''.join(lines))
+        with open(f"{path}/continuation.json", 'w') as outfile:
+            json.dump({'previous': os.path.relpath(self.path, start=path)}, outfile)
+        return True
+
+    def release(self):
+        """Frees the memory used by the data read so far. It will be read again if needed."""
+        for attribute in self.lazy_attributes:
+            self.__dict__.pop(attribute, None)
+
+    def get_specnum(self, columns=None, cache=True):
+        """Returns the column names and data of specnum_output.txt. If cache is True, they are read from a binary
+        cache in the job directory that is created the first time and rebuilt whenever specnum_output.txt changes; use
+        cache=False for read-only result trees or running jobs."""
+        return read_specnum(self.path, columns=columns, cache=cache)
+
+    def get_tof(self, molecule, ignore=0.2, cache=True):
+        return get_tof(path=self.path, molecule=molecule, area=self.area, ignore=ignore, cache=cache)
+
+    def get_selectivity(self, main, secondary, minimum=0.0, ignore=0.2, cache=True):
+        return get_selectivity(path=self.path, main=main, secondary=secondary, minimum=minimum, ignore=ignore,
+                               area=self.area, cache=cache)
+
+    def analyze(self, products=None, selectivity=None, coverages=True, ignore=0.2, cache=True):
+        """Calculates the TOF of each molecule in products, the selectivity of each main product in selectivity
+        ({main: [secondary, ...]}) and, if coverages is True, the average coverage of all surface species, reading the
+        data only once.
+
+        Example:
+        >>> job = KMCJob(path='./co_oxidation_500K')
+        >>> results = job.analyze(products=['CO2'], selectivity={'CH4': ['CO2']}, ignore=0.2)
+        >>> results['tof']['CO2'], results['selectivity']['CH4'], results['coverage']['CO*']
+        """
+        surf_species = read_specnum_header(self.path)[5:5 + self.n_surf_species] if coverages else None
+        return analyze(path=self.path, area=self.area, products=products, selectivity=selectivity,
+                       surf_species=surf_species, n_sites=self.n_sites, ignore=ignore, cache=cache)
+
+    def get_process_statistics(self, ignore=0.2, steps=None):
+        """Returns the event frequencies, forward/reverse ratios and partial equilibrium indices of each step (see
+        analysis_functions.get_process_statistics). Pass steps=ReactionModel.df.index to match the rows to a reaction
+        model, e.g. to choose the dict_manual_scaling of the next job."""
+        return get_process_statistics(path=self.path, ignore=ignore, steps=steps)
 
     def plot_production(self, molecule=None):
         plt_production(self.path, self.n_surf_species, molecule)
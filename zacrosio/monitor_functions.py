@@ -0,0 +1,150 @@
+import io
+import os
+import numpy as np
+import pandas as pd
+from zacrosio.read_functions import parse_general_output, job_status
+
+
+class SpecnumWatcher:
+    """Follows the specnum_output.txt file of a (running) job, parsing only the rows appended since the last update.
+
+    The TOF of each molecule is obtained from running least-squares sums, so each update costs O(new rows) and the
+    rows themselves are not kept in memory. Only rows with time >= t_start are used for the TOFs. The file is read in
+    blocks of at most block_size bytes, so that attaching a watcher to a long job does not load its whole backlog.
+
+    Example:
+    >>> watcher = SpecnumWatcher(path='./co_oxidation_500K', molecules=['CO2'])
+    >>> watcher.update()
+    >>> watcher.summary()
+    {'path': './co_oxidation_500K', 'n_rows': 1520, 'time': 0.76, 'CO2': 1130.0, 'tof_CO2': 1.49}
+    """
+
+    def __init__(self, path, molecules, area=None, t_start=0.0, block_size=2 ** 22):
+        self.path = path
+        self.molecules = list(molecules)
+        self.t_start = t_start
+        self.block_size = block_size
+        self._area = area
+        self.reset()
+
+    def reset(self):
+        """Forgets everything read so far, so the next update reads the file from the beginning."""
+        self.offset = 0
+        self.header = None
+        self.error = None
+        self.columns = None
+        self.n_rows = 0
+        self.last_row = None
+        self._t0 = None
+        self._n = 0
+        self._sum_t = 0.0
+        self._sum_t2 = 0.0
+        self._sum_y = np.zeros(len(self.molecules))
+        self._sum_ty = np.zeros(len(self.molecules))
+
+    @property
+    def area(self):
+        if self._area is None:
+            self._area = parse_general_output(self.path, fields=['area']).get('area')
+        return self._area
+
+    def update(self):
+        """Reads the complete rows appended to specnum_output.txt since the last update. Returns the number of new
+        rows. Nothing is read until the header line is complete; if a molecule is not in the header, the error is
+        kept in self.error (and shown by summary) instead of stopping the program."""
+        file_path = f"{self.path}/specnum_output.txt"
+        if not os.path.isfile(file_path):
+            return 0
+        if os.path.getsize(file_path) < self.offset:  # the file has been rewritten
+            self.reset()
+        if self.header is None:
+            with open(file_path, 'rb') as infile:
+                first_line = infile.readline()
+            if not first_line.endswith(b'\n'):  # the header is still being written
+                return 0
+            header = first_line.decode().split()
+            missing = [column for column in ['Time'] + self.molecules if column not in header]
+            if missing:
+                self.error = f"{', '.join(missing)} not found"
+                return 0
+            self.error = None
+            self.header = header
+            self.columns = [header.index('Time')] + [header.index(molecule) for molecule in self.molecules]
+            self.offset = len(first_line)
+        n_new_rows = 0
+        with open(file_path, 'rb') as infile:
+            while True:
+                infile.seek(self.offset)
+                data = infile.read(self.block_size)
+                end = data.rfind(b'\n') + 1  # an incomplete last line is left for the next update
+                if end == 0:
+                    break
+                self.offset += end
+                if data[:end].strip():
+                    df = pd.read_csv(io.BytesIO(data[:end]), sep=r'\s+', header=None, usecols=sorted(set(self.columns)),
+                                     dtype=float, engine='c')
+                    n_new_rows += self.add_rows(df[self.columns].to_numpy())
+                if len(data) < self.block_size:
+                    break
+        return n_new_rows
+
+    def add_rows(self, rows):
+        """Adds the Time and production columns of new rows to the running sums. Returns the number of rows."""
+        n_new_rows = len(rows)
+        if n_new_rows == 0:
+            return 0
+        self.n_rows += n_new_rows
+        self.last_row = rows[-1]
+        rows = rows[rows[:, 0] >= self.t_start]
+        if len(rows):
+            if self._t0 is None:
+                self._t0 = rows[0, 0]
+            t = rows[:, 0] - self._t0  # shifted to keep the sums well conditioned
+            y = rows[:, 1:]
+            self._n += len(rows)
+            self._sum_t += t.sum()
+            self._sum_t2 += (t ** 2).sum()
+            self._sum_y += y.sum(axis=0)
+            self._sum_ty += t @ y
+        return n_new_rows
+
+    def get_tof(self):
+        """Returns the current TOF of each molecule (slope of the production over the time, divided by the area)."""
+        denominator = self._n * self._sum_t2 - self._sum_t ** 2
+        if self._n < 2 or denominator <= 0 or self.area is None:
+            return {molecule: float('NaN') for molecule in self.molecules}
+        slopes = (self._n * self._sum_ty - self._sum_t * self._sum_y) / denominator
+        return {molecule: float(slope) / self.area for molecule, slope in zip(self.molecules, slopes)}
+
+    def summary(self):
+        """Returns the number of rows read, the last time, the last production and the TOF of each molecule."""
+        summary = {'path': self.path, 'n_rows': self.n_rows}
+        if self.error is not None:
+            summary['error'] = self.error
+        if self.last_row is not None:
+            summary['time'] = float(self.last_row[0])
+            for molecule, value in zip(self.molecules, self.last_row[1:]):
+                summary[molecule] = float(value)
+        if self._n >= 2:
+            for molecule, tof in self.get_tof().items():
+                summary[f"tof_{molecule}"] = tof
+        return summary
+
+
+def monitor_jobs(watchers):
+    """Updates a list of SpecnumWatcher objects and returns a dataframe with their summaries and the status of each
+    job (see job_status), e.g. to be shown in a dashboard.
+
+    Example:
+    >>> watchers = [SpecnumWatcher(path, molecules=['CO2']) for path in glob.glob('./co_oxidation_*K')]
+    >>> while True:
+    >>>     print(monitor_jobs(watchers))
+    >>>     time.sleep(60)
+    """
+    status = job_status([watcher.path for watcher in watchers])
+    rows = []
+    for watcher in watchers:
+        if status[watcher.path] != 'not_started':
+            watcher.update()
+        rows.append({**watcher.summary(), 'status': status[watcher.path]})
+    return pd.DataFrame(rows).set_index('path')
@@ -1,50 +1,136 @@
-import sys
+import os
 import numpy as np
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
+from concurrent.futures import ProcessPoolExecutor
+from zacrosio.read_functions import read_specnum, read_specnum_header, get_data_from_general_output
+from zacrosio.profiling_functions import profile
 
 
-def plt_coverage(path):
-    with open(f"{path}/specnum_output.txt", "r") as infile:
-        header = infile.readline().split()
-    data = np.loadtxt(f"{path}/specnum_output.txt", skiprows=1)
-    for i in range(5, len(header)):
-        plt.plot(data[:, 2], data[:, i], label=header[i])
-    plt.xlabel(header[2])
-    plt.ylabel("Number of species")
-    plt.legend()
-    plt.show()
+def decimate(x, y, n_points=2000):
+    """Reduces a time series to about n_points points for plotting, keeping the minimum and maximum of y in each of
+    n_points / 2 buckets of x, so that peaks and steps are preserved. The first and last points are always kept.
 
+    Returns the decimated x and y.
+    """
+    n = len(x)
+    n_buckets = max(1, n_points // 2)
+    if n <= n_points:
+        return x, y
+    bucket_size = int(np.ceil(n / n_buckets))
+    n_padded = bucket_size * int(np.ceil(n / bucket_size))
+    padded = np.pad(y, (0, n_padded - n), mode='edge').reshape(-1, bucket_size)
+    offsets = np.arange(0, n_padded, bucket_size)
+    index = np.concatenate([[0], offsets + np.argmin(padded, axis=1), offsets + np.argmax(padded, axis=1), [n - 1]])
+    index = np.unique(np.clip(index, 0, n - 1))
+    return x[index], y[index]
 
-def plt_production(path, n_surf_species, molecule):
-    with open(f"{path}/specnum_output.txt", "r") as infile:
-        header = infile.readline().split()
-    data = np.loadtxt(f"{path}/specnum_output.txt", skiprows=1)
+
+def get_tof_curve(time, production, area, window=0.05):
+    """Calculates the TOF as a function of time with a centered finite difference over a time window (fraction of the
+    total simulation time), which smooths the stochastic noise of the production.
+
+    Returns the TOF (molec·s-1·Å-2) at each time.
+    """
+    half_window = window * (time[-1] - time[0]) / 2
+    start = np.searchsorted(time, time - half_window)
+    end = np.clip(np.searchsorted(time, time + half_window, side='right') - 1, 0, len(time) - 1)
+    delta_time = time[end] - time[start]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        tof = np.where(delta_time > 0, (production[end] - production[start]) / delta_time, np.nan) / area
+    return tof
+
+
+@profile()
+def plt_coverage(path, n_points=2000, ax=None):
+    show = ax is None
+    ax = plt.gca() if ax is None else ax
+    header, data = read_specnum(path, columns=['Time'] + read_specnum_header(path)[5:])
+    for i in range(1, len(header)):
+        ax.plot(*decimate(data[:, 0], data[:, i], n_points), label=header[i])
+    ax.set_xlabel(header[0])
+    ax.set_ylabel("Number of species")
+    ax.legend()
+    if show:
+        plt.show()
+
+
+@profile()
+def plt_production(path, n_surf_species, molecule, n_points=2000, ax=None):
+    show = ax is None
+    ax = plt.gca() if ax is None else ax
     if molecule is None:
-        for i in range(5 + n_surf_species, len(header)):
+        header, data = read_specnum(path, columns=['Time'] + read_specnum_header(path)[5 + n_surf_species:])
+        for i in range(1, len(header)):
             if data[-1, i] > 0:
-                plt.plot(data[:, 2], data[:, i], label=header[i])
+                ax.plot(*decimate(data[:, 0], data[:, i], n_points), label=header[i])
     else:
-        if molecule not in header:
-            sys.exit(f"ERROR: {molecule} not found")
-        plt.plot(data[:, 2], data[:, header.index(molecule)], label=header[header.index(molecule)])
-    plt.xlabel("KMC time (s)")
-    plt.ylabel("Number of species")
-    plt.legend()
-    plt.show()
-
-
-def plt_tof(path, area, molecule):
-    with open(f"{path}/specnum_output.txt", "r") as infile:
-        header = infile.readline().split()
-    if molecule not in header:
-        sys.exit(f"ERROR: {molecule} not found")
-    data = np.loadtxt(f"{path}/specnum_output.txt", skiprows=1)
-    kmc_time = data[-1, 2]
-    tof = np.diff(data[:, header.index(molecule)] / area, data[:, 2], 0.1)
-    plt.plot(data[:, 2], tof, label=header[header.index(molecule)])
-    #tof = dxdt(x=data[:, header.index(molecule)] / area, t=data[:, 2], kind="finite_difference", k=10)
-    plt.plot(data[:, 2], tof, label=header[header.index(molecule)])
-    plt.xlabel("KMC time (s)")
-    plt.ylabel("TOF (molec·s-1·Å-2)")
-    plt.legend()
-    plt.show()
+        header, data = read_specnum(path, columns=['Time', molecule])
+        ax.plot(*decimate(data[:, 0], data[:, 1], n_points), label=molecule)
+    ax.set_xlabel("KMC time (s)")
+    ax.set_ylabel("Number of species")
+    ax.legend()
+    if show:
+        plt.show()
+
+
+@profile()
+def plt_tof(path, area, molecule, window=0.05, n_points=2000, ax=None):
+    show = ax is None
+    ax = plt.gca() if ax is None else ax
+    header, data = read_specnum(path, columns=['Time', molecule])
+    tof = get_tof_curve(data[:, 0], data[:, 1], area=area, window=window)
+    ax.plot(*decimate(data[:, 0], tof, n_points), label=molecule)
+    ax.set_xlabel("KMC time (s)")
+    ax.set_ylabel("TOF (molec·s-1·Å-2)")
+    ax.legend()
+    if show:
+        plt.show()
+
+
+def plt_job(ax, path, kind, molecule=None, n_points=2000):
+    """Draws one kind of plot ('coverage', 'production' or 'tof') of a job on a given matplotlib axis."""
+    if kind == 'coverage':
+        plt_coverage(path, n_points=n_points, ax=ax)
+    elif kind == 'production':
+        n_surf_species = get_data_from_general_output(path)[0]
+        plt_production(path, n_surf_species, molecule, n_points=n_points, ax=ax)
+    elif kind == 'tof':
+        area = get_data_from_general_output(path)[2]
+        plt_tof(path, area, molecule, n_points=n_points, ax=ax)
+    ax.set_title(os.path.basename(os.path.normpath(path)), fontsize='small')
+
+
+@profile()
+def save_plot_grid(paths, kind, file_path, molecule=None, ncols=4, n_points=2000):
+    """Saves a grid with one plot per job to an image file, without opening any window."""
+    nrows = int(np.ceil(len(paths) / ncols))
+    fig = Figure(figsize=(4 * ncols, 3 * nrows), layout='constrained')
+    axes = fig.subplots(nrows, ncols, squeeze=False).ravel()
+    for ax, path in zip(axes, paths):
+        plt_job(ax, path, kind, molecule=molecule, n_points=n_points)
+    for ax in axes[len(paths):]:
+        ax.set_visible(False)
+    fig.savefig(file_path)
+    return file_path
+
+
+def _save_plot_grid(args):
+    return save_plot_grid(*args)
+
+
+def plt_batch(paths, kind, output_dir, molecule=None, jobs_per_figure=16, ncols=4, n_points=2000, workers=None):
+    """Renders the plots of many jobs to image files in parallel, jobs_per_figure jobs per file (arranged in a grid).
+
+    Example:
+    >>> plt_batch(paths=sorted(glob.glob('./co_oxidation_*K')), kind='tof', molecule='CO2', output_dir='./plots')
+    """
+    paths = list(paths)
+    if not os.path.exists(output_dir):
+        os.mkdir(output_dir)
+    tasks = [(paths[i:i + jobs_per_figure], kind, f"{output_dir}/{kind}_{i // jobs_per_figure:03d}.png", molecule,
+              ncols, n_points) for i in range(0, len(paths), jobs_per_figure)]
+    if workers == 1:
+        return [save_plot_grid(*task) for task in tasks]
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        return list(executor.map(_save_plot_grid, tasks))
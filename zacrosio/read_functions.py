@@ -1,10 +1,44 @@
-import subprocess
+import io
 import sys
 import os
+import json
+import mmap
+import time
+import numpy as np
+import pandas as pd
+from zacrosio.profiling_functions import profile
 
 
 def check_finished(path):
-    return 'Normal termination' in str(subprocess.check_output(f"tail -n4 {path}/general_output.txt", shell=True))
+    return 'Normal termination' in ''.join(read_last_lines(f"{path}/general_output.txt", n=4))
+
+
+def job_status(paths, max_idle=None):
+    """Classifies each job as 'finished', 'running', 'crashed' or 'not_started' from the last lines of its
+    general_output.txt, without spawning any process.
+
+    A job is 'crashed' if the end of general_output.txt reports an error, or if max_idle (in seconds) is given and the
+    file has not been modified for longer than that without a normal termination.
+
+    Returns a dictionary {path: status}.
+    """
+    status = {}
+    now = time.time()
+    for path in paths:
+        file_path = f"{path}/general_output.txt"
+        if not os.path.isfile(file_path):
+            status[path] = 'not_started'
+            continue
+        tail = ''.join(read_last_lines(file_path, n=20))
+        if 'Normal termination' in tail:
+            status[path] = 'finished'
+        elif 'error' in tail.lower():
+            status[path] = 'crashed'
+        elif max_idle is not None and now - os.path.getmtime(file_path) > max_idle:
+            status[path] = 'crashed'
+        else:
+            status[path] = 'running'
+    return status
 
 
 def read_file(file_path):
@@ -13,6 +47,22 @@ def read_file(file_path):
     return lines
 
 
+def read_last_lines(file_path, n=1, block_size=4096):
+    """Returns the last n lines of a file, reading it backwards in blocks from the end so that only the end of the
+    file is read."""
+    with open(file_path, 'rb') as f:
+        f.seek(0, os.SEEK_END)
+        position = f.tell()
+        data = b''
+        while position > 0 and data.count(b'\n') <= n:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            data = f.read(read_size) + data
+    lines = data.decode(errors='replace').splitlines(keepends=True)
+    return lines[-n:] if n > 0 else []
+
+
 def read_last_line(file_path):
     with open(file_path, 'rb') as f:
         try:  # catch OSError in case of a one line file
@@ -24,16 +74,46 @@ def read_last_line(file_path):
         return f.readline().decode()
 
 
+def get_complete_size(file_path, block_size=4096):
+    """Returns the number of bytes of a file up to the end of its last complete line, reading backwards from the end.
+    Bytes after the last newline belong to a line that is still being written."""
+    with open(file_path, 'rb') as f:
+        position = f.seek(0, os.SEEK_END)
+        while position > 0:
+            read_size = min(block_size, position)
+            position -= read_size
+            f.seek(position)
+            end = f.read(read_size).rfind(b'\n')
+            if end != -1:
+                return position + end + 1
+    return 0
+
+
+class FileHead(io.RawIOBase):
+    """Read-only stream with the first size bytes of a file, used to parse only the complete lines of an output file
+    that is still being written (see get_complete_size)."""
+
+    def __init__(self, file_path, size):
+        self.file = open(file_path, 'rb')
+        self.remaining = size
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self.file.read(min(len(buffer), self.remaining))
+        buffer[:len(data)] = data
+        self.remaining -= len(data)
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
 def get_data_from_general_output(path):
-    lines = read_file(f"{path}/general_output.txt")
-    n_surf_species, n_sites, area = 0, 0, 0
-    for line in lines:
-        if 'Number of surface species' in line:
-            n_surf_species = int(line.split()[-1])
-        if 'Total number of lattice sites' in line:
-            n_sites = int(line.split()[-1])
-        if 'Lattice surface area' in line:
-            area = float(line.split()[-1])
+    data = parse_general_output(path, fields=['n_surf_species', 'n_sites', 'area'])
+    n_surf_species, n_sites, area = data.get('n_surf_species', 0), data.get('n_sites', 0), data.get('area', 0)
     if n_surf_species == 0:
         sys.exit("ERROR: n_surf_species = 0")
     elif n_sites == 0:
@@ -43,39 +123,404 @@ def get_data_from_general_output(path):
     return n_surf_species, n_sites, area
 
 
-def parse_line(dmatch, line):
-    for key in dmatch.items():
-        if key in line:
-            return key, True
-    return None, None
+general_output_fields = {'n_gas_species': ('Number of gas species:', int),
+                         'gas_species': ('Gas species names:', str.split),
+                         'n_surf_species': ('Number of surface species:', int),
+                         'surf_species': ('Surface species names:', str.split),
+                         'n_sites': ('Total number of lattice sites:', int),
+                         'area': ('Lattice surface area:', float),
+                         'n_elementary_steps': ('Number of elementary steps:', int)}
+general_output_sections = {'site_types': 'Site type names and total number of sites of that type',
+                           'reaction_network': 'Reaction network:',
+                           'stiffness_scalable_steps': 'Stiffness scaling enabled for the following elementary steps'}
+
 
+@profile()
+def parse_general_output(path, fields=None):
+    """Parses the header of the general_output.txt file, reading it line by line and stopping as soon as all the
+    requested fields have been found (or when the simulation starts), so the event reports are never read.
 
-def parse_general_output(path):
-    dmatch = ['Number of surface species',
-              'Total number of lattice sites',
-              'Lattice surface area',
-              'Site type names and total number of sites of that type']
+    Arguments:
+        path (str): The path of the job
+        fields (list): Fields to read (default: all). Available fields are n_gas_species, gas_species,
+            n_surf_species, surf_species, n_sites, area, n_elementary_steps, site_types ({name: number of sites}),
+            reaction_network ({step: {'pre_expon': A(Tini), 'activ_eng': Ea}}) and stiffness_scalable_steps
+            (list of steps)
+
+    Returns a dictionary with the fields found.
+    """
+    if fields is None:
+        fields = list(general_output_fields) + list(general_output_sections)
+    pending = set(fields)
     data = {}
-    with open(f"{path}/general_output.txt", 'r') as file_object:
-        line = file_object.readline()
-        while len(dmatch) != 0:
-            if 'Number of surface species' in line:
-                data['n_surf_species'] = int(line.split()[-1])
-                dmatch.remove('Number of surface species')
-            if 'Total number of lattice sites' in line:
-                data['n_sites'] = int(line.split()[-1])
-                dmatch.remove('Total number of lattice sites')
-            if 'Lattice surface area' in line:
-                data['area'] = float(line.split()[-1])
-                dmatch.remove('Lattice surface area')
-            if 'Site type names and total number of sites of that type' in line:
-                line = file_object.readline()
+    with open(f"{path}/general_output.txt", 'r') as infile:
+        line = infile.readline()
+        while pending and line and 'Commencing simulation' not in line:
+            for field in [field for field in pending if field in general_output_fields]:
+                marker, converter = general_output_fields[field]
+                if marker in line:
+                    data[field] = converter(line.split(marker)[-1].strip())
+                    pending.remove(field)
+            if 'site_types' in pending and general_output_sections['site_types'] in line:
                 site_types = {}
+                line = infile.readline()
                 while line.strip():
-                    num_sites_of_given_type = int(line.strip().split(' ')[1].replace('(', '').replace(')', ''))
-                    site_types[line.strip().split(' ')[0]] = num_sites_of_given_type
-                    line = file_object.readline()
+                    name, num_sites = line.split()[:2]
+                    site_types[name] = int(num_sites.replace('(', '').replace(')', ''))
+                    line = infile.readline()
                 data['site_types'] = site_types
-                dmatch.remove('Site type names and total number of sites of that type')
-            line = file_object.readline()
-        return data
+                pending.remove('site_types')
+            elif 'reaction_network' in pending and general_output_sections['reaction_network'] in line:
+                reaction_network = {}
+                line = infile.readline()
+                while line and not line.strip():  # skip blank lines before the list
+                    line = infile.readline()
+                while line.strip():
+                    step, values = line.split('.', 1)[1].split(':', 1)
+                    values = values.replace(';', ' ').split()
+                    reaction_network[step.strip()] = {'pre_expon': float(values[values.index('A(Tini)') + 2]),
+                                                      'activ_eng': float(values[values.index('Ea') + 2])}
+                    line = infile.readline()
+                data['reaction_network'] = reaction_network
+                pending.remove('reaction_network')
+            elif 'stiffness_scalable_steps' in pending and general_output_sections['stiffness_scalable_steps'] in line:
+                steps = []
+                line = infile.readline()
+                while line.strip() and 'Fwd/Rev' in line:
+                    steps.append(line.split(' - ', 1)[-1].strip())
+                    line = infile.readline()
+                data['stiffness_scalable_steps'] = steps
+                pending.remove('stiffness_scalable_steps')
+            line = infile.readline()
+    return data
+
+
+def read_specnum_header(path):
+    """Returns the column names of the specnum_output.txt file."""
+    with open(f"{path}/specnum_output.txt", 'r') as infile:
+        return infile.readline().split()
+
+
+def check_columns(header, columns):
+    for column in columns:
+        if column not in header:
+            sys.exit(f"ERROR: {column} not found")
+
+
+def get_segments(path):
+    """Returns the list of job directories that form one simulation, from the first to the last, following the
+    continuation.json files written by KMCJob.create_continuation. For a job that is not a continuation, this is
+    just [path].
+
+    The previous job is stored relative to the continuation directory (absolute paths are also accepted), so a
+    campaign can be moved or copied as a whole."""
+    segments = [path]
+    visited = {os.path.realpath(path)}
+    while os.path.isfile(f"{segments[0]}/continuation.json"):
+        with open(f"{segments[0]}/continuation.json", 'r') as infile:
+            previous = os.path.normpath(os.path.join(segments[0], json.load(infile)['previous']))
+        if os.path.realpath(previous) in visited:
+            sys.exit(f"ERROR: the continuation.json files of {path} form a loop")
+        visited.add(os.path.realpath(previous))
+        segments.insert(0, previous)
+    return segments
+
+
+@profile()
+def read_specnum(path, columns=None, cache=False):
+    """Reads the specnum_output.txt file, loading only the requested columns. If the job is a continuation of a
+    previous one (see KMCJob.create_continuation), the output of all the segments is joined into one time series.
+
+    Arguments:
+        path (str): The path of the job
+        columns (list): Column names to read (e.g. ['Time', 'CO2']). If None, all columns are read.
+        cache (bool): If True, the data is read from a binary cache (see load_specnum_cache), which is created the
+            first time.
+
+    Returns the list of column names read and a 2D NumPy array with one column per name.
+    """
+    segments = get_segments(path)
+    if len(segments) == 1:
+        return read_specnum_segment(path, columns=columns, cache=cache)
+    if columns is None:
+        columns = read_specnum_header(path)
+    columns = list(dict.fromkeys(columns))
+    list_data = []
+    last_time = -np.inf
+    for segment in segments:
+        header, data = read_specnum_segment(segment, columns=columns + ['Time'], cache=cache)
+        time = data[:, header.index('Time')]
+        data = data[time > last_time]  # rows repeated at the restart point are discarded
+        if len(data):
+            last_time = time[-1]
+        list_data.append(data[:, :len(columns)])
+    return columns, np.concatenate(list_data)
+
+
+def read_specnum_segment(path, columns=None, cache=False):
+    """Reads the specnum_output.txt file of a single job directory (see read_specnum)."""
+    if cache:
+        header, data = load_specnum_cache(path)
+        if columns is None:
+            return header, data
+        check_columns(header, columns)
+        columns = list(dict.fromkeys(columns))
+        return columns, data[:, [header.index(column) for column in columns]]
+    header = read_specnum_header(path)
+    if columns is None:
+        columns = header
+    else:
+        check_columns(header, columns)
+    columns = list(dict.fromkeys(columns))
+    file_path = f"{path}/specnum_output.txt"
+    size = get_complete_size(file_path)  # the last line may still be written by a running simulation
+    if size == 0:
+        return columns, np.empty((0, len(columns)))
+    with io.BufferedReader(FileHead(file_path, size)) as infile:
+        df = pd.read_csv(infile, sep=r'\s+', usecols=columns, dtype=float, engine='c')
+    return columns, df[columns].to_numpy()
+
+
+def load_specnum_cache(path):
+    """Returns the header and the data of specnum_output.txt from a binary cache (.specnum_output.npy and
+    .specnum_output.json in the job directory). The data is memory-mapped, so it is not loaded until it is used.
+
+    The cache is (re)built from the text file when it does not exist or when the size or modification time of
+    specnum_output.txt has changed.
+    """
+    source = f"{path}/specnum_output.txt"
+    cache_data = f"{path}/.specnum_output.npy"
+    cache_info = f"{path}/.specnum_output.json"
+    stat = os.stat(source)
+    info = None
+    if os.path.isfile(cache_info) and os.path.isfile(cache_data):
+        with open(cache_info, 'r') as infile:
+            info = json.load(infile)
+        if info['size'] != stat.st_size or info['mtime_ns'] != stat.st_mtime_ns:
+            info = None
+    if info is None:
+        header, data = read_specnum_segment(path)
+        info = {'header': header,
+                'columns': {column: i for i, column in enumerate(header)},
+                'n_rows': len(data),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns}
+        np.save(f"{cache_data}.tmp.npy", np.asfortranarray(data))  # column-major, so that columns are contiguous
+        os.replace(f"{cache_data}.tmp.npy", cache_data)
+        with open(f"{cache_info}.tmp", 'w') as outfile:
+            json.dump(info, outfile)
+        os.replace(f"{cache_info}.tmp", cache_info)
+    return info['header'], np.load(cache_data, mmap_mode='r')
+
+
+def clear_specnum_cache(path):
+    """Removes the binary cache of specnum_output.txt, if any."""
+    for file_name in ['.specnum_output.npy', '.specnum_output.json']:
+        if os.path.isfile(f"{path}/{file_name}"):
+            os.remove(f"{path}/{file_name}")
+
+
+def iter_specnum(path, columns=None, chunk_size=100000):
+    """Reads the specnum_output.txt file in chunks of chunk_size rows, so that memory use is bounded. Continuations
+    are joined as in read_specnum.
+
+    Yields the list of column names read and a 2D NumPy array with the rows of each chunk.
+    """
+    header = read_specnum_header(path)
+    if columns is None:
+        columns = header
+    else:
+        check_columns(header, columns)
+    columns = list(dict.fromkeys(columns))
+    last_time = -np.inf
+    for segment in get_segments(path):
+        file_path = f"{segment}/specnum_output.txt"
+        size = get_complete_size(file_path)
+        if size == 0:
+            continue
+        with io.BufferedReader(FileHead(file_path, size)) as infile, \
+                pd.read_csv(infile, sep=r'\s+', usecols=list(dict.fromkeys(columns + ['Time'])), dtype=float,
+                            engine='c', chunksize=chunk_size) as reader:
+            for df in reader:
+                df = df[df['Time'] > last_time]
+                if len(df):
+                    last_time = df['Time'].iloc[-1]
+                    yield columns, df[columns].to_numpy()
+
+
+def get_data_from_simulation_input(path):
+    """Returns the temperature (K), total pressure (bar), partial pressure of each gas species (bar) and, if present,
+    the max_time, max_steps and wall_time tags from the simulation_input.dat file."""
+    data = {}
+    gas_specs_names, gas_molar_fracs = [], []
+    with open(f"{path}/simulation_input.dat", 'r') as infile:
+        for line in infile:
+            if not line.strip() or line.startswith('#'):
+                continue
+            tag, *values = line.split()
+            if tag == 'temperature':
+                data['T'] = float(values[0])
+            elif tag == 'pressure':
+                data['pressure'] = float(values[0])
+            elif tag == 'gas_specs_names':
+                gas_specs_names = values
+            elif tag == 'gas_molar_fracs':
+                gas_molar_fracs = [float(x) for x in values]
+            elif tag in ['max_time', 'wall_time']:
+                data[tag] = float(values[0])
+            elif tag == 'max_steps':
+                data[tag] = int(values[0]) if values[0].isdigit() else float(values[0])  # may be 'infinity'
+    for molecule, molar_frac in zip(gas_specs_names, gas_molar_fracs):
+        data[f"p_{molecule}"] = molar_frac * data.get('pressure', float('NaN'))
+    return data
+
+
+def read_procstat_header(path):
+    """Returns the names of the elementary steps in procstat_output.txt (e.g. CO_adsorption_fwd)."""
+    with open(f"{path}/procstat_output.txt", 'r') as infile:
+        return infile.readline().split()[1:]  # first column is Overall
+
+
+def iter_procstat(path):
+    """Reads the procstat_output.txt file one snapshot at a time, skipping the waiting times. A last snapshot that is
+    still being written is not returned.
+
+    Yields the KMC time and a NumPy array with the (cumulative) number of occurrences of each elementary step, in the
+    order given by read_procstat_header.
+    """
+    with open(f"{path}/procstat_output.txt", 'r') as infile:
+        n_steps = len(infile.readline().split()) - 1  # first column is Overall
+        for line in infile:
+            if line.startswith('configuration'):
+                infile.readline()  # waiting times
+                counts = infile.readline()
+                if not counts.endswith('\n'):
+                    return
+                occurrences = np.array(counts.split()[1:], dtype=np.int64)
+                if len(occurrences) != n_steps:
+                    return
+                yield float(line.split()[-1]), occurrences
+
+
+def read_procstat(path):
+    """Reads all the snapshots of the procstat_output.txt file (see iter_procstat).
+
+    Returns the list of elementary step names, an array with the time of each snapshot and a 2D array with the
+    number of occurrences of each step (one row per snapshot, one column per step).
+    """
+    steps = read_procstat_header(path)
+    time = []
+    occurrences = []
+    for t, counts in iter_procstat(path):
+        time.append(t)
+        occurrences.append(counts)
+    occurrences = np.array(occurrences, dtype=np.int64).reshape(len(time), len(steps))
+    return steps, np.array(time, dtype=float), occurrences
+
+
+def read_procstat_window(path, ignore=0.2):
+    """Returns the number of occurrences of each step at the first snapshot after final_time * ignore and at the last
+    complete snapshot, keeping only those two snapshots in memory.
+
+    Returns the list of step names, the two times and the two arrays of occurrences.
+    """
+    steps = read_procstat_header(path)
+    times = []
+    last = None
+    for time, occurrences in iter_procstat(path):
+        times.append(time)
+        last = (time, occurrences)
+    if len(times) < 2:
+        sys.exit(f"ERROR: less than two complete snapshots in {path}/procstat_output.txt")
+    index = next(i for i, time in enumerate(times) if time >= times[-1] * ignore)
+    start = next(snapshot for i, snapshot in enumerate(iter_procstat(path)) if i == index)
+    return steps, (start[0], last[0]), (start[1], last[1])
+
+
+def read_history_header(path):
+    """Returns the gas species, surface species and site types listed at the top of history_output.txt."""
+    header = {}
+    with open(f"{path}/history_output.txt", 'r') as infile:
+        for key in ['gas_species', 'surf_species', 'site_types']:
+            header[key] = infile.readline().split()[1:]
+    return header
+
+
+def get_history_index(path):
+    """Returns the byte offset and the KMC time of each snapshot in history_output.txt.
+
+    The index is built with a single pass over the (memory-mapped) file and saved in .history_output.index.npz, so
+    it is only rebuilt when the size or modification time of history_output.txt changes. A last snapshot that is still
+    being written (fewer than n_sites + 2 lines) is not indexed.
+    """
+    source = f"{path}/history_output.txt"
+    cache = f"{path}/.history_output.index.npz"
+    stat = os.stat(source)
+    if stat.st_size == 0:
+        return np.zeros(1, dtype=np.int64), np.array([], dtype=float)
+    if os.path.isfile(cache):
+        with np.load(cache) as index:
+            if index['size'] == stat.st_size and index['mtime_ns'] == stat.st_mtime_ns:
+                return index['offsets'], index['times']
+    n_sites = None
+    if os.path.isfile(f"{path}/general_output.txt"):
+        n_sites = parse_general_output(path, fields=['n_sites']).get('n_sites')
+    offsets, times = [], []
+    with open(source, 'rb') as infile, mmap.mmap(infile.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        stop = mm.rfind(b'\n') + 1  # an incomplete last line is not part of any snapshot
+        position = mm.find(b'configuration')
+        while position != -1:
+            end = mm.find(b'\n', position)
+            if end == -1:  # configuration line still being written
+                break
+            offsets.append(position)
+            times.append(float(mm[position:end].split()[3]))
+            position = mm.find(b'\nconfiguration', end)
+            if position != -1:
+                position += 1
+        if offsets:
+            if n_sites is not None:
+                n_lines = n_sites + 2  # configuration line, one line per site and gas counts
+            elif len(offsets) > 1:
+                n_lines = mm[offsets[-2]:offsets[-1]].count(b'\n')
+            else:
+                n_lines = 0
+            if mm[offsets[-1]:stop].count(b'\n') < n_lines:
+                stop = offsets.pop()
+                times.pop()
+    offsets = np.array(offsets + [stop], dtype=np.int64)  # last element marks the end of the last snapshot
+    times = np.array(times, dtype=float)
+    np.savez(f"{cache}.tmp.npz", offsets=offsets, times=times, size=stat.st_size, mtime_ns=stat.st_mtime_ns)
+    os.replace(f"{cache}.tmp.npz", cache)
+    return offsets, times
+
+
+def read_history_snapshot(path, snapshot, index=None):
+    """Reads a single snapshot of history_output.txt, without reading the rest of the file.
+
+    Arguments:
+        path (str): The path of the job
+        snapshot (int): Snapshot number (starting at 0; negative numbers count from the end)
+        index (tuple): Offsets and times returned by get_history_index (read from disk if not given)
+
+    Returns the KMC time, an integer array with one row per site and the columns (site, adsorbate entity, species,
+    dentate), and an array with the number of molecules of each gas species produced.
+    """
+    offsets, times = index if index is not None else get_history_index(path)
+    snapshot = range(len(times))[snapshot]
+    with open(f"{path}/history_output.txt", 'rb') as infile:
+        infile.seek(offsets[snapshot])
+        data = infile.read(offsets[snapshot + 1] - offsets[snapshot])
+    body = data[data.index(b'\n') + 1:]
+    lines = body.rstrip().rsplit(b'\n', 1)
+    lattice_state = np.fromstring(lines[0].decode(), dtype=np.int32, sep=' ').reshape(-1, 4)
+    gas_counts = np.fromstring(lines[1].decode(), dtype=np.int64, sep=' ') if len(lines) > 1 else np.array([])
+    return times[snapshot], lattice_state, gas_counts
+
+
+def iter_history(path, start=0, stop=None, step=1):
+    """Reads the snapshots of history_output.txt one at a time (see read_history_snapshot), so that only one
+    snapshot is in memory."""
+    index = get_history_index(path)
+    for snapshot in range(len(index[1]))[start:stop:step]:
+        yield read_history_snapshot(path, snapshot, index=index)
@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import asyncio
+from zacrosio.read_functions import check_finished, get_data_from_simulation_input
+
+
+def load_state(state_path):
+    if os.path.isfile(state_path):
+        with open(state_path, 'r') as infile:
+            return json.load(infile)
+    return {}
+
+
+def save_state(state, state_path):
+    with open(f"{state_path}.tmp", 'w') as outfile:
+        json.dump(state, outfile, indent=1)
+    os.replace(f"{state_path}.tmp", state_path)
+
+
+def is_finished(path):
+    return os.path.isfile(f"{path}/general_output.txt") and check_finished(path)
+
+
+def call_stop_when(stop_when, path):
+    """Calls stop_when(path). An error (e.g. while reading the output of a job that is being written) means that the
+    job is not stopped. Returns the decision and the error message, if any."""
+    try:
+        return bool(stop_when(path)), None
+    except (Exception, SystemExit) as error:
+        return False, f"{type(error).__name__}: {error}"
+
+
+async def run_job(path, executable, cores, state, state_path, wall_time_margin, stop_when=None, poll_interval=60.0):
+    """Runs one job on the first free core and updates its entry in the state. Any error is recorded as a failure of
+    this job only, and the ZACROS process is never left running."""
+    core = await cores.get()
+    process = None
+    try:
+        try:
+            wall_time = get_data_from_simulation_input(path).get('wall_time')
+            timeout = wall_time * wall_time_margin if wall_time is not None else None
+            state[path] = {'status': 'running', 'core': core}
+            save_state(state, state_path)
+            with open(f"{path}/std_output.txt", 'w') as outfile:
+                process = await asyncio.create_subprocess_exec(os.path.abspath(executable), cwd=path, stdout=outfile,
+                                                               stderr=asyncio.subprocess.STDOUT)
+                if core is not None:
+                    os.sched_setaffinity(process.pid, {core})
+                loop = asyncio.get_running_loop()
+                start = loop.time()
+                status = None
+                while True:
+                    wait = poll_interval if stop_when is not None else None
+                    if timeout is not None:
+                        remaining = max(0.0, timeout - (loop.time() - start))
+                        wait = remaining if wait is None else min(wait, remaining)
+                    try:
+                        return_code = await asyncio.wait_for(process.wait(), timeout=wait)
+                        break
+                    except asyncio.TimeoutError:
+                        if timeout is not None and loop.time() - start >= timeout:
+                            status = 'timeout'
+                        elif stop_when is not None:
+                            stop, error = await asyncio.to_thread(call_stop_when, stop_when, path)
+                            if error is not None:
+                                state[path] = {**state[path], 'stop_when_error': error}
+                                save_state(state, state_path)
+                            if not stop:
+                                continue
+                            status = 'stopped'
+                        else:
+                            continue
+                        process.kill()
+                        return_code = await process.wait()
+                        break
+            if status is None:
+                status = 'finished' if is_finished(path) else 'failed'
+            state[path] = {'status': status, 'core': core, 'return_code': return_code}
+        except asyncio.CancelledError:
+            state[path] = {'status': 'pending'}
+            raise
+        except (Exception, SystemExit) as error:
+            state[path] = {'status': 'failed', 'core': core, 'error': f"{type(error).__name__}: {error}"}
+        finally:
+            if process is not None and process.returncode is None:
+                process.kill()
+                await process.wait()
+            save_state(state, state_path)
+    finally:
+        cores.put_nowait(core)
+
+
+async def run_jobs_async(paths, executable, max_workers=None, cores=None, state_path=None, wall_time_margin=1.1,
+                         rerun_failed=True, stop_when=None, poll_interval=60.0):
+    """Coroutine version of run_jobs."""
+    paths = list(paths)
+    if state_path is None:
+        root = os.path.commonpath([os.path.dirname(os.path.abspath(path)) for path in paths])
+        state_path = f"{root}/.scheduler_state.json"
+    state = load_state(state_path)
+    if cores is None:
+        cores = [None] * (max_workers or os.cpu_count())
+    else:
+        cores = list(cores)
+        if not hasattr(os, 'sched_setaffinity'):
+            sys.exit("ERROR: pinning jobs to cores is not supported on this platform")
+        for core in cores:
+            if core not in os.sched_getaffinity(0):
+                sys.exit(f"ERROR: core {core} not available")
+    queue = asyncio.Queue()
+    for core in cores:
+        queue.put_nowait(core)
+
+    pending = []
+    for path in paths:
+        if is_finished(path):
+            state[path] = {**state.get(path, {}), 'status': 'finished'}
+        elif state.get(path, {}).get('status') == 'stopped':
+            continue
+        elif state.get(path, {}).get('status') in ['failed', 'timeout'] and not rerun_failed:
+            continue
+        else:
+            state[path] = {'status': 'pending'}
+            pending.append(path)
+    save_state(state, state_path)
+    await asyncio.gather(*[run_job(path, executable, queue, state, state_path, wall_time_margin, stop_when=stop_when,
+                                   poll_interval=poll_interval) for path in pending])
+    return {path: state[path]['status'] for path in paths}
+
+
+def run_jobs(paths, executable, max_workers=None, cores=None, state_path=None, wall_time_margin=1.1,
+             rerun_failed=True, stop_when=None, poll_interval=60.0):
+    """Runs ZACROS in many job directories, with up to max_workers simulations at the same time.
+
+    The status of each job (pending, running, finished, stopped, failed or timeout) is saved in a JSON file after every
+    change, so an interrupted campaign can be resumed by calling run_jobs again: jobs whose general_output.txt
+    reports a normal termination are not run again. An error in one job (e.g. a missing simulation_input.dat) is
+    saved as 'failed' with its message and does not stop the other jobs.
+
+    Arguments:
+        paths (list): Job directories (e.g. created with NewKMCJob.create_job_dir)
+        executable (str): Path of the ZACROS executable
+        max_workers (int): Maximum number of simultaneous jobs (default: number of CPUs). Ignored if cores is given
+        cores (list): CPU cores to use; each job is pinned to one of them and one job runs per core
+        state_path (str): JSON file with the status of each job. Default is .scheduler_state.json in the common
+            parent directory of the jobs
+        wall_time_margin (float): A job is killed after wall_time (from simulation_input.dat) times this factor
+        rerun_failed (bool): If False, jobs that failed or timed out in a previous call are not run again
+        stop_when (callable): Function called every poll_interval seconds with the path of each running job. If it
+            returns True the job is stopped (status 'stopped'), e.g. when its TOF is converged. If it raises an
+            error, the job keeps running and the last error is saved in the state as 'stop_when_error'
+        poll_interval (float): Time in seconds between calls to stop_when
+
+    Returns a dictionary {path: status}.
+
+    Example:
+    >>> status = run_jobs(paths=glob.glob('./co_oxidation_*K'), executable='./zacros.x', cores=range(0, 32))
+    >>>
+    >>> def tof_converged(path):
+    >>>     return get_tof_estimate(path, molecule='CO2', area=get_data_from_general_output(path)[2])['converged']
+    >>>
+    >>> status = run_jobs(paths=glob.glob('./co_oxidation_*K'), executable='./zacros.x', stop_when=tof_converged)
+    """
+    return asyncio.run(run_jobs_async(paths=paths, executable=executable, max_workers=max_workers, cores=cores,
+                                      state_path=state_path, wall_time_margin=wall_time_margin,
+                                      rerun_failed=rerun_failed, stop_when=stop_when, poll_interval=poll_interval))
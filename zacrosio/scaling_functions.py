@@ -0,0 +1,101 @@
+import os
+import sys
+import math
+import subprocess
+import pandas as pd
+from zacrosio.kmc_job import KMCJob
+
+
+def run_zacros(path, executable):
+    """Runs a ZACROS executable in the job directory and waits until it finishes."""
+    with open(f"{path}/std_output.txt", 'w') as outfile:
+        subprocess.run([os.path.abspath(executable)], cwd=path, stdout=outfile, stderr=subprocess.STDOUT, check=False)
+
+
+def get_scaling_factors(df_procstat, dict_manual_scaling=None, separation=100.0, pe_tolerance=0.05):
+    """Calculates new manual scaling factors from the process statistics of a simulation.
+
+    Steps in partial equilibrium (pe_index within 0.5 ± pe_tolerance) whose forward rate is more than separation times
+    the fastest non-equilibrated step are slowed down by the whole number of orders of magnitude in excess, so that
+    they stay at least separation times faster. An excess of less than one order of magnitude is accepted.
+
+    Arguments:
+        df_procstat (pd.DataFrame): Process statistics, as returned by get_process_statistics
+        dict_manual_scaling (dict): Scaling factors used in the simulation, as passed to NewKMCJob.create_job_dir
+        separation (float): Target ratio between the fast (equilibrated) steps and the slow steps
+        pe_tolerance (float): Maximum deviation of pe_index from 0.5 for a step to be considered equilibrated
+
+    Returns the new dict_manual_scaling and a boolean that is True if no more scaling is needed.
+    """
+    dict_manual_scaling = dict(dict_manual_scaling or {})
+    active = df_procstat[df_procstat['rate_fwd'] > 0]
+    equilibrated = (active['pe_index'] - 0.5).abs() <= pe_tolerance
+    slow = active[~equilibrated]
+    if slow.empty:
+        return dict_manual_scaling, True
+    reference_rate = slow['rate_fwd'].max()
+    converged = True
+    for step, rate in active.loc[equilibrated, 'rate_fwd'].items():
+        excess = math.floor(math.log10(rate / (separation * reference_rate)))
+        if excess > 0:
+            dict_manual_scaling[step] = dict_manual_scaling.get(step, 0) + excess
+            converged = False
+    return dict_manual_scaling, converged
+
+
+def find_scaling_factors(job, path, T, simulation_tags, dict_pressure, executable=None, run=None,
+                         dict_manual_scaling=None, pilot_tags=None, separation=100.0, pe_tolerance=0.05,
+                         ignore=0.2, max_iterations=10, **kwargs):
+    """Finds the manual scaling factors of a reaction model by running a sequence of short pilot simulations.
+
+    Each iteration creates a job in path/iteration_<i> with the current scaling factors, runs it, reads its
+    procstat_output.txt and rescales the fast equilibrated steps (see get_scaling_factors), until the separation
+    between fast and slow steps reaches the target or max_iterations is reached.
+
+    Arguments:
+        job (NewKMCJob): The job used to write the input files
+        path (str): Directory where the pilot jobs are created
+        T, simulation_tags, dict_pressure: As in NewKMCJob.create_job_dir. simulation_tags must enable
+            process_statistics
+        executable (str): Path of the ZACROS executable
+        run (callable): Function called with the path of each pilot job to run it, instead of executable (e.g. a mock)
+        dict_manual_scaling (dict): Initial scaling factors
+        pilot_tags (dict): Tags that override simulation_tags for the pilot runs, e.g. {'max_time': 1.0e-3}
+        separation, pe_tolerance: See get_scaling_factors
+        ignore (float): Fraction of the pilot simulation time that is discarded
+        max_iterations (int): Maximum number of pilot runs
+        **kwargs: Other keyword arguments passed to NewKMCJob.create_job_dir (e.g. repeat_cell)
+
+    Returns the final dict_manual_scaling and a dataframe with the scaling factors of each iteration.
+
+    Example:
+    >>> dict_manual_scaling, df_history = find_scaling_factors(
+    >>>     job=my_job, path='./scaling_500K', T=500, simulation_tags=simulation_tags,
+    >>>     dict_pressure={'CO': 1.2, 'O2': 0.01}, executable='./zacros.x', pilot_tags={'max_time': 1.0e-3})
+    """
+    if executable is None and run is None:
+        sys.exit("ERROR: either executable or run is required")
+    if run is None:
+        def run(job_path):
+            run_zacros(job_path, executable)
+    dict_manual_scaling = dict(dict_manual_scaling or {})
+    tags = {**simulation_tags, **(pilot_tags or {})}
+    if not os.path.exists(path):
+        os.mkdir(path)
+    history = []
+    for iteration in range(max_iterations):
+        job_path = f"{path}/iteration_{iteration}"
+        if not job.create_job_dir(path=job_path, T=T, simulation_tags=tags, dict_pressure=dict_pressure,
+                                  dict_manual_scaling=dict_manual_scaling, **kwargs):
+            sys.exit(f"ERROR: {job_path} already exists, remove it or choose another path")
+        run(job_path)
+        df_procstat = KMCJob(job_path).get_process_statistics(ignore=ignore, steps=job.reaction_model.df.index)
+        history.append({'iteration': iteration, **dict_manual_scaling})
+        dict_manual_scaling, converged = get_scaling_factors(df_procstat=df_procstat,
+                                                             dict_manual_scaling=dict_manual_scaling,
+                                                             separation=separation, pe_tolerance=pe_tolerance)
+        if converged:
+            break
+    else:
+        print(f"Scaling factors not converged after {max_iterations} iterations")
+    return dict_manual_scaling, pd.DataFrame(history).set_index('iteration').fillna(0)